@@ -6,9 +6,12 @@ import os
 import json
 from dotenv import load_dotenv
 import time
+from filterCache import FilterCache
 
 load_dotenv()
 
+FILTER_CACHE = FilterCache()
+
 
 
 '''
@@ -17,6 +20,11 @@ That gets you your categories. But the same prompt can be used to get the summar
 
 def get_llm_response(user_input):
     starttime = time.time()
+    cached = FILTER_CACHE.lookup(user_input)
+    if cached is not None:
+        print(f"Cached Execution Time: {time.time() - starttime:.4f} seconds")
+        print(FILTER_CACHE.get_stats())
+        return cached
     today = datetime.today()
     """Uses GPT to extract category and date from user input and return a structured response."""
     prompt = f"""
@@ -79,6 +87,7 @@ def get_llm_response(user_input):
     print(f"Execution Time: {elapsed_time:.4f} seconds")
     print(response.usage.total_tokens)
     print(response.choices[0].message.content)
+    FILTER_CACHE.store(user_input, response.choices[0].message.content)
     return response.choices[0].message.content
 
 def main():
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+CACHE_PATH = os.getenv("ARTICLE_CACHE_PATH", "articleCache.db")
+HEADLINE_TTL = int(os.getenv("ARTICLE_CACHE_HEADLINE_TTL", 15 * 60))
+RECENT_TTL = int(os.getenv("ARTICLE_CACHE_RECENT_TTL", 60 * 60))
+
+def make_key(news, url, params):
+    #api keys never take part in the key so rotating them keeps the cache warm
+    cleanParams = {k: v for k, v in params.items() if k != news["apiKeyParam"]}
+    raw = json.dumps([news["name"], url, sorted(cleanParams.items())], default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def get_ttl(news, url, params):
+    """Seconds an entry stays fresh, None means it never expires."""
+    if url == news["headLineUrl"]:
+        return HEADLINE_TTL
+    today = datetime.today().strftime("%Y-%m-%d")
+    #without a to date the provider answers through today, so only closed past ranges are final
+    lastDate = params.get(news["toDateParam"])
+    if lastDate and lastDate[:10] < today:
+        return None
+    return RECENT_TTL
+
+class ArticleCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                url TEXT NOT NULL,
+                params TEXT NOT NULL,
+                body TEXT NOT NULL,
+                storedAt REAL NOT NULL,
+                expiresAt REAL
+            )""")
+        self.conn.commit()
+
+    def get(self, news, url, params):
+        key = make_key(news, url, params)
+        with self.lock:
+            row = self.conn.execute("SELECT body, expiresAt FROM articles WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if row[1] is not None and row[1] < time.time():
+                self.stats["stale"] += 1
+                return None
+            self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, news, url, params, articles, ttl="auto"):
+        if ttl == "auto":
+            ttl = get_ttl(news, url, params)
+        now = time.time()
+        expiresAt = None if ttl is None else now + ttl
+        cleanParams = {k: v for k, v in params.items() if k != news["apiKeyParam"]}
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (make_key(news, url, params), news["name"], url, json.dumps(cleanParams),
+                 json.dumps(articles), now, expiresAt))
+            self.conn.commit()
+
+    def purge(self, provider=None, expiredOnly=False):
+        query = "DELETE FROM articles WHERE 1 = 1"
+        args = []
+        if provider is not None:
+            query += " AND provider = ?"
+            args.append(provider)
+        if expiredOnly:
+            query += " AND expiresAt IS NOT NULL AND expiresAt < ?"
+            args.append(time.time())
+        with self.lock:
+            removed = self.conn.execute(query, args).rowcount
+            self.conn.commit()
+        return removed
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"] + stats["stale"]
+        stats["hitRate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
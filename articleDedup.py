@@ -0,0 +1,86 @@
+import os
+import re
+import zlib
+import random
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY", 0.6))
+
+#xor masks over one crc32 per shingle stand in for independent hash functions and are much cheaper
+_random = random.Random(1234)
+HASH_MASKS = [_random.getrandbits(32) for _ in range(NUM_PERMUTATIONS)]
+
+def normalize_url(url):
+    if not url:
+        return None
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith("utm_")])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower().removeprefix("www."), parts.path.rstrip("/"), query, ""))
+
+def shingles(text):
+    #NewsAPI truncates content with "[+1234 chars]", which would make identical stories look different
+    text = re.sub(r'\[\+\d+ chars\]', '', text or '').lower()
+    words = re.findall(r'\w+', text)
+    if len(words) < SHINGLE_SIZE:
+        return set(words)
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash(shingleSet):
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingleSet]
+    if not hashes:
+        return None
+    return tuple(min(h ^ mask for h in hashes) for mask in HASH_MASKS)
+
+def estimated_similarity(first, second):
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERMUTATIONS
+
+def find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+def union(parents, i, j):
+    rootI, rootJ = find(parents, i), find(parents, j)
+    if rootI != rootJ:
+        parents[max(rootI, rootJ)] = min(rootI, rootJ)
+
+def dedupe_articles(articles, threshold=SIMILARITY_THRESHOLD):
+    """Collapses exact URL matches and near-duplicate stories, merging their categories and sources.
+
+    Returns (keptArticles, removedArticles).
+    """
+    parents = list(range(len(articles)))
+    seenUrls = {}
+    buckets = {}
+    signatures = []
+    for i, article in enumerate(articles):
+        url = normalize_url(article.url)
+        if url in seenUrls:
+            union(parents, seenUrls[url], i)
+        elif url:
+            seenUrls[url] = i
+        signature = minhash(shingles(f"{article.title or ''} {article.content or ''}"))
+        signatures.append(signature)
+        if signature is None:
+            continue
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS:(band + 1) * ROWS])
+            for j in buckets.get(key, []):
+                if find(parents, i) != find(parents, j) and estimated_similarity(signature, signatures[j]) >= threshold:
+                    union(parents, i, j)
+            buckets.setdefault(key, []).append(i)
+    groups = {}
+    for i in range(len(articles)):
+        groups.setdefault(find(parents, i), []).append(articles[i])
+    kept = []
+    removed = []
+    for group in groups.values():
+        best = max(group, key=lambda article: len(article.content or ""))
+        kept.append(best.merged_with(article for article in group if article is not best))
+        removed += [article for article in group if article is not best]
+    return kept, removed
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import date, timedelta
+from articles import Article
+from articleDedup import normalize_url
+from ranking import source_of
+
+STORE_PATH = os.getenv("ARTICLE_STORE_PATH", "articleStore.db")
+#most articles one store query hands to dedup and ranking
+QUERY_LIMIT = int(os.getenv("ARTICLE_STORE_QUERY_LIMIT", 200))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS articles (
+        id TEXT PRIMARY KEY,
+        title TEXT,
+        author TEXT,
+        publishedAt TEXT,
+        content TEXT,
+        url TEXT,
+        source TEXT,
+        ingestedAt REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS articles_published ON articles (substr(publishedAt, 1, 10));
+    CREATE INDEX IF NOT EXISTS articles_source ON articles (source);
+    CREATE TABLE IF NOT EXISTS tags (
+        id TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        category TEXT NOT NULL,
+        country TEXT NOT NULL,
+        language TEXT NOT NULL,
+        PRIMARY KEY (provider, category, country, language, id)
+    );
+    CREATE TABLE IF NOT EXISTS coverage (
+        provider TEXT NOT NULL,
+        category TEXT NOT NULL,
+        country TEXT NOT NULL,
+        language TEXT NOT NULL,
+        day TEXT NOT NULL,
+        fetchedAt REAL NOT NULL,
+        PRIMARY KEY (provider, category, country, language, day)
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5 (title, content, content='articles', content_rowid='rowid');
+    CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO articles_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);
+    END;
+"""
+
+def article_id(article):
+    return hashlib.sha1((normalize_url(article.url) if article.url else article.title or "").encode("utf-8")).hexdigest()
+
+def date_range(dates):
+    """Every day of a filters date list as YYYY-MM-DD, a single date runs until today."""
+    first = date.fromisoformat(dates[0][:10])
+    last = date.fromisoformat(dates[1][:10]) if len(dates) > 1 else date.today()
+    return [(first + timedelta(days=offset)).isoformat() for offset in range((last - first).days + 1)]
+
+def fts_query(keywords):
+    terms = re.findall(r"\w+", keywords.lower())
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+class ArticleStore:
+    """Every normalized article ever fetched, with a full text index and a record of which days were fetched.
+
+    Readers get one connection per thread, writes go through a lock, and WAL keeps them from blocking each other.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.local = threading.local()
+        self.writeLock = threading.Lock()
+        self.stats = {"storeAnswers": 0, "gapFetches": 0, "ingested": 0}
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def ingest(self, articles, provider, category, country="", language=""):
+        """Bulk inserts articles and tags them with the request they came from, in one transaction."""
+        now = time.time()
+        rows = [(article_id(article), article.title, article.author, article.publishedAt, article.content, article.url, source_of(article), now)
+                for article in articles]
+        if not rows:
+            return 0
+        conn = self.connection()
+        with self.writeLock, conn:
+            inserted = conn.executemany("INSERT OR IGNORE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows).rowcount
+            conn.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?, ?, ?, ?)", [(row[0], provider, category, country, language) for row in rows])
+            self.stats["ingested"] += inserted
+        return inserted
+
+    def missing_days(self, provider, category, country, language, days):
+        """Days still to fetch from the provider, today is always among them since its news keeps changing."""
+        rows = self.connection().execute(
+            "SELECT day FROM coverage WHERE provider = ? AND category = ? AND country = ? AND language = ? AND day BETWEEN ? AND ?",
+            (provider, category, country, language, days[0], days[-1])).fetchall()
+        covered = {row[0] for row in rows}
+        today = date.today().isoformat()
+        missing = [day for day in days if day not in covered or day >= today]
+        with self.writeLock:
+            self.stats["gapFetches" if missing else "storeAnswers"] += 1
+        return missing
+
+    def mark_covered(self, provider, category, country, language, days):
+        today = date.today().isoformat()
+        days = [day for day in days if day < today]
+        now = time.time()
+        conn = self.connection()
+        with self.writeLock, conn:
+            conn.executemany("INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?, ?)",
+                             [(provider, category, country, language, day, now) for day in days])
+
+    def query(self, provider, category, country, language, fromDay, toDay, keywords=None, limit=QUERY_LIMIT):
+        """Stored articles one provider returned for this request, plus its articles matching keywords in the full text index."""
+        sql = """SELECT a.title, a.author, a.publishedAt, a.content, a.url FROM articles a
+                 WHERE substr(a.publishedAt, 1, 10) BETWEEN ? AND ?
+                 AND (a.id IN (SELECT id FROM tags WHERE provider = ? AND category = ? AND country = ? AND language = ?)"""
+        args = [fromDay, toDay, provider, category, country, language]
+        if keywords and fts_query(keywords):
+            sql += " OR (a.rowid IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?) AND a.id IN (SELECT id FROM tags WHERE provider = ?))"
+            args += [fts_query(keywords), provider]
+        sql += ") ORDER BY a.publishedAt DESC LIMIT ?"
+        args.append(limit)
+        rows = self.connection().execute(sql, args).fetchall()
+        return [Article(*row, [category], [provider]) for row in rows]
+
+    def search(self, keywords, fromDay=None, toDay=None, limit=QUERY_LIMIT):
+        """Full text search over everything stored, best matches first."""
+        if not fts_query(keywords):
+            return []
+        sql = """SELECT a.title, a.author, a.publishedAt, a.content, a.url, json_group_array(DISTINCT t.category), json_group_array(DISTINCT t.provider)
+                 FROM articles_fts f JOIN articles a ON a.rowid = f.rowid JOIN tags t ON t.id = a.id
+                 WHERE articles_fts MATCH ?"""
+        args = [fts_query(keywords)]
+        if fromDay is not None:
+            sql += " AND substr(a.publishedAt, 1, 10) BETWEEN ? AND ?"
+            args += [fromDay, toDay or date.today().isoformat()]
+        sql += " GROUP BY a.id ORDER BY min(f.rank) LIMIT ?"
+        args.append(limit)
+        rows = self.connection().execute(sql, args).fetchall()
+        return [Article(*row[:5], json.loads(row[5]), json.loads(row[6])) for row in rows]
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        conn = self.connection()
+        stats["articles"] = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        stats["coveredDays"] = conn.execute("SELECT COUNT(*) FROM coverage").fetchone()[0]
+        return stats
@@ -0,0 +1,67 @@
+class Article:
+    __slots__ = ("title", "author", "publishedAt", "content", "url", "categories", "apiSources")
+
+    def __init__(self, title, author, publishedAt, content, url, categories, apiSources):
+        self.title = title
+        self.author = author
+        self.publishedAt = publishedAt
+        self.content = content
+        self.url = url
+        self.categories = categories
+        self.apiSources = apiSources
+
+    def merged_with(self, others):
+        """Copy of this article carrying the categories and sources of its duplicates too."""
+        group = [self] + list(others)
+        return Article(self.title, self.author, self.publishedAt, self.content, self.url,
+                       list(dict.fromkeys(category for article in group for category in article.categories)),
+                       list(dict.fromkeys(source for article in group for source in article.apiSources)))
+
+    def render(self):
+        return f'''Author: {self.author}\nTitle: {self.title}\nPublished At: {self.publishedAt}\nContent: {self.content}\nCategory: {', '.join(self.categories)}\nApiSource: {', '.join(self.apiSources)}\n'''
+
+def category_label(category):
+    if isinstance(category, dict):
+        return f"{list(category.items())[0][0]}: {list(category.items())[0][1]}"
+    return category
+
+def from_newsapi(article, category, apiName):
+    return Article(article.get('title'), article.get('author'), article.get('publishedAt'), article.get('content'),
+                   article.get('url'), [category_label(category)], [apiName])
+
+def from_gnews(article, category, apiName):
+    return Article(article.get('title'), (article.get('source') or {}).get('name'), article.get('publishedAt'), article.get('content'),
+                   article.get('url'), [category_label(category)], [apiName])
+
+def from_mediastack(article, category, apiName):
+    return Article(article.get('title'), article.get('author'), article.get('published_at'), article.get('description'),
+                   article.get('url'), [category_label(category)], [apiName])
+
+NORMALIZERS = {
+    "NewsApi": from_newsapi,
+    "GNews": from_gnews,
+    "MediaStack": from_mediastack
+}
+
+def normalize_articles(news, articlesList, category):
+    normalizer = NORMALIZERS.get(news["name"])
+    if normalizer is None:
+        return []
+    return [normalizer(article, category, news["name"]) for article in articlesList]
+
+class ArticleCollection:
+    def __init__(self, articles=None):
+        self.articles = list(articles or [])
+
+    def extend(self, articles):
+        self.articles.extend(articles)
+
+    def render(self):
+        #built once, right before the prompt, instead of growing a string per provider
+        return '\n\n'.join([article.render() for article in self.articles])
+
+    def __iter__(self):
+        return iter(self.articles)
+
+    def __len__(self):
+        return len(self.articles)
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import concurrent.futures
+from langchain.schema import SystemMessage
+from chatHistory import ChatHistory
+import newsV6
+
+CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+QUERY_KEYS = ("query", "userInput", "input")
+
+def read_queries(path):
+    """Yields (index, record, error) for every non-blank line, without loading the whole file.
+
+    error describes a line that is not valid JSON, record is None then.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield index, None, f"Line {index + 1} is not valid JSON: {e.msg} at character {e.pos}"
+
+def query_of(record):
+    if isinstance(record, str):
+        return record
+    if not isinstance(record, dict):
+        return None
+    for key in QUERY_KEYS:
+        if isinstance(record.get(key), str) and record[key].strip():
+            return record[key]
+    return None
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class SharedFetches:
+    """Fetches and dedups each distinct set of filters once per batch, later queries with the same filters wait for it."""
+
+    def __init__(self):
+        self.results = {}
+        self.lock = threading.Lock()
+        self.stats = {"fetches": 0, "shared": 0}
+
+    def get(self, response, userInput):
+        key = json.dumps([response, newsV6.wants_headlines(userInput)], sort_keys=True)
+        with self.lock:
+            future = self.results.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self.results[key] = future
+            self.stats["fetches" if owner else "shared"] += 1
+        if owner:
+            try:
+                future.set_result(newsV6.fetch_stage(response, userInput))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+class BatchRunner:
+    def __init__(self, concurrency=CONCURRENCY, pipelined=newsV6.PIPELINED):
+        self.concurrency = concurrency
+        self.pipelined = pipelined
+        self.fetches = SharedFetches()
+
+    def run_query(self, index, record, error=None):
+        userInput = query_of(record)
+        result = {"index": index, "id": record.get("id", record.get("request_id")) if isinstance(record, dict) else None, "query": userInput}
+        if error is not None:
+            result["error"] = error
+            return result
+        if userInput is None:
+            result["error"] = f"No query under any of {', '.join(QUERY_KEYS)}" if isinstance(record, dict) else f"Expected an object or a string, got {type(record).__name__}"
+            return result
+        chatHistory = ChatHistory([SystemMessage(content=newsV6.SYSTEM_PROMPT)])
+        startTime = time.perf_counter()
+        try:
+            response = json.loads(newsV6.get_filters(userInput, chatHistory))
+            filterTime = time.perf_counter()
+            if self.pipelined:
+                #fetching and summarizing overlap, so there is no fetch stage to share or time on its own
+                articles = None
+                fetchTime = filterTime
+                summary = newsV6.pipelined_stage(response, userInput, chatHistory)
+            else:
+                articles = self.fetches.get(response, userInput)
+                fetchTime = time.perf_counter()
+                summary = newsV6.summarize_stage(articles, response, userInput, chatHistory)
+        except Exception as e:
+            result["error"] = str(e)
+            result["latency"] = round(time.perf_counter() - startTime, 4)
+            return result
+        endTime = time.perf_counter()
+        result.update({
+            "filters": response,
+            "summary": summary,
+            "articles": len(articles) if articles is not None else None,
+            "latency": round(endTime - startTime, 4),
+            "filterLatency": round(filterTime - startTime, 4),
+            "fetchLatency": round(fetchTime - filterTime, 4),
+            "summaryLatency": round(endTime - fetchTime, 4),
+            "tokens": chatHistory.usedTokens
+        })
+        return result
+
+    def run(self, inputPath, outputPath):
+        """Streams results to outputPath as queries finish, at most concurrency queries in flight."""
+        latencies = []
+        tokens = 0
+        errors = 0
+        startTime = time.perf_counter()
+        queries = read_queries(inputPath)
+        with open(outputPath, "w", encoding="utf-8") as out, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            pending = set()
+            for index, record, error in queries:
+                pending.add(executor.submit(self.run_query, index, record, error))
+                if len(pending) < self.concurrency * 2:
+                    continue
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    tokens, errors = self.write_result(out, future.result(), latencies, tokens, errors)
+            for future in concurrent.futures.as_completed(pending):
+                tokens, errors = self.write_result(out, future.result(), latencies, tokens, errors)
+        elapsedTime = time.perf_counter() - startTime
+        return {
+            "queries": len(latencies) + errors,
+            "errors": errors,
+            "elapsed": round(elapsedTime, 4),
+            "throughput": round(len(latencies) / elapsedTime, 4) if elapsedTime else 0.0,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "tokens": tokens,
+            "fetches": dict(self.fetches.stats)
+        }
+
+    def write_result(self, out, result, latencies, tokens, errors):
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        if "error" in result:
+            print(f"Query {result['index']} failed: {result['error']}")
+            return tokens, errors + 1
+        latencies.append(result["latency"])
+        return tokens + result["tokens"], errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize every query of a JSONL file")
+    parser.add_argument("input", help="JSONL file with one query per line, under query, userInput or input")
+    parser.add_argument("output", help="JSONL file the results are written to")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--pipelined", action="store_true", default=newsV6.PIPELINED, help="summarize each provider's articles as they land")
+    args = parser.parse_args(argv)
+    report = BatchRunner(args.concurrency, args.pipelined).run(args.input, args.output)
+    print("**********************************")
+    print(f"Batch of {report['queries']} queries Execution Time: {report['elapsed']:.4f} seconds")
+    print(report)
+    print("**********************************")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
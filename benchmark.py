@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import types
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import concurrent.futures
+from langchain.schema import AIMessage, SystemMessage
+from langchain.schema.messages import AIMessageChunk
+from chatHistory import ChatHistory
+from mockProvider import FIXTURES_PATH, ProviderCorpus, load_fixtures
+
+#filler the stub model repeats to reach its output length
+STUB_WORDS = ("The main stories today cover markets, policy, sport and research, with several outlets "
+              "reporting the same developments and analysts expecting further updates this week.").split()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def load_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
+
+class ReplayResponse:
+    def __init__(self, body, status=200):
+        self.status_code = status
+        self.headers = {}
+        self.body = body
+        self.text = json.dumps(body)[:200]
+
+    def json(self):
+        return self.body
+
+class ProviderReplay:
+    """Stands in for fetchEngine.http_get and answers from the recorded responses in process.
+
+    mockProvider.ProviderCorpus does the filtering, paging and restamping, so the replay and the
+    mock provider server give the pipeline the same answers.
+    """
+
+    def __init__(self, newsApis, fixtures, latency=0.0, jitter=0.0):
+        self.corpus = ProviderCorpus(newsApis, fixtures)
+        self.prefixes = [(news["headLineUrl"].rsplit("/", 1)[0], news["name"]) for news in newsApis]
+        self.latency = latency
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def __call__(self, url, params=None, timeout=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        provider = next((name for prefix, name in self.prefixes if url.startswith(prefix + "/")), None)
+        status, body = self.corpus.respond(provider, url.rsplit("/", 1)[-1], params or {})
+        return ReplayResponse(body, status)
+
+class ApproximateEncoding:
+    """About four characters per token, for benchmark machines where tiktoken cannot load its encoding files."""
+
+    def encode(self, text):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens):
+        return ''.join(tokens)
+
+def use_token_encoding(approximate):
+    """Returns True when token counts are approximate, either asked for or because tiktoken cannot load offline."""
+    import tokenCounter
+    if not approximate:
+        try:
+            tokenCounter.get_encoding()
+            return False
+        except Exception as e:
+            print(f"tiktoken could not load ({e}), token counts in this run are approximate")
+    tokenCounter.get_encoding = lambda model="gpt-4": ApproximateEncoding()
+    return True
+
+class StubChatModel:
+    """Answers like ChatOpenAI after latency seconds plus outputTokens at tokensPerSecond."""
+
+    def __init__(self, latency=0.5, tokensPerSecond=50.0, outputTokens=150):
+        self.latency = latency
+        self.tokensPerSecond = tokensPerSecond
+        self.outputTokens = outputTokens
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def bind(self, max_tokens=None, **kwargs):
+        return StubChatModel(self.latency, self.tokensPerSecond, min(self.outputTokens, max_tokens or self.outputTokens))
+
+    def words(self):
+        with self.lock:
+            self.calls += 1
+        return [STUB_WORDS[i % len(STUB_WORDS)] for i in range(self.outputTokens)]
+
+    def invoke(self, messages):
+        words = self.words()
+        time.sleep(self.latency + len(words) / self.tokensPerSecond)
+        return AIMessage(content=' '.join(words))
+
+    def stream(self, messages):
+        time.sleep(self.latency)
+        for i, word in enumerate(self.words()):
+            time.sleep(1 / self.tokensPerSecond)
+            yield AIMessageChunk(content=word if i == 0 else f" {word}")
+
+    async def astream(self, messages):
+        await asyncio.sleep(self.latency)
+        for i, word in enumerate(self.words()):
+            await asyncio.sleep(1 / self.tokensPerSecond)
+            yield AIMessageChunk(content=word if i == 0 else f" {word}")
+
+def stub_openai(latency, parse_filters):
+    """Stand-in for the openai module used by get_filters, it answers with the local parser's filters."""
+    def create(model=None, messages=None, **kwargs):
+        time.sleep(latency)
+        userInput = messages[-1]["content"].rsplit("Input:", 1)[-1].strip()
+        filters, confidence = parse_filters(userInput)
+        if not filters["categories"]:
+            filters["categories"] = ["general"]
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=json.dumps(filters)))],
+                                     usage=types.SimpleNamespace(total_tokens=len(userInput.split()) + 600))
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    return types.SimpleNamespace(OpenAI=lambda *args, **kwargs: client)
+
+def load_pipeline(args, workDir):
+    """Imports newsV6 with every cache in workDir and the providers and models replaced by recordings and stubs."""
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ["TRACE_LOG"] = args.trace_log
+    for variable, name in (("ARTICLE_CACHE_PATH", "articleCache.db"), ("ARTICLE_STORE_PATH", "articleStore.db"),
+                           ("SUMMARY_CACHE_PATH", "summaryCache.db"), ("FILTER_CACHE_PATH", "filterCache.json")):
+        os.environ[variable] = os.path.join(workDir, name)
+    args.approximateTokens = use_token_encoding(args.approximate_tokens)
+    #imported late so the environment above is what the modules read
+    import resilience
+    import newsV6
+    from filterParser import parse_filters
+    if not args.rate_limits:
+        for news in newsV6.NEWS_APIS:
+            news["ratePerSecond"] = 1000
+            news["dailyQuota"] = None
+    replay = ProviderReplay(newsV6.NEWS_APIS, load_fixtures(args.fixtures), args.provider_latency, args.provider_jitter)
+    resilience.http_get = replay
+    newsV6.model = StubChatModel(args.llm_latency, args.llm_tokens_per_second, args.llm_output_tokens)
+    newsV6.openai = stub_openai(args.llm_latency, parse_filters)
+    return newsV6, replay
+
+def run_session(newsV6, sessionIndex, queries, requests):
+    chatHistory = ChatHistory([SystemMessage(content=newsV6.SYSTEM_PROMPT)])
+    results = []
+    for i in range(requests):
+        userInput = queries[(sessionIndex + i) % len(queries)]
+        startTokens = chatHistory.usedTokens
+        startTime = time.perf_counter()
+        firstToken = None
+        parts = []
+        try:
+            for part in newsV6.process_request(userInput, chatHistory, [], stream=True):
+                if firstToken is None:
+                    firstToken = time.perf_counter()
+                parts.append(part)
+        except Exception as e:
+            results.append({"query": userInput, "error": f"{type(e).__name__}: {e}"})
+            continue
+        endTime = time.perf_counter()
+        chatHistory.append(AIMessage(content=''.join(parts)))
+        results.append({
+            "query": userInput,
+            "latency": endTime - startTime,
+            "firstToken": (firstToken or endTime) - startTime,
+            "tokens": chatHistory.usedTokens - startTokens
+        })
+    return results
+
+def run_benchmark(args):
+    workDir = tempfile.mkdtemp(prefix="newsBenchmark")
+    newsV6, replay = load_pipeline(args, workDir)
+    queries = load_queries(args.queries)
+    if args.tracemalloc:
+        tracemalloc.start()
+    startTime = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="session") as executor:
+        futures = [executor.submit(run_session, newsV6, i, queries, args.requests) for i in range(args.sessions)]
+        results = [result for future in futures for result in future.result()]
+    elapsedTime = time.perf_counter() - startTime
+    peakMemory = None
+    if args.tracemalloc:
+        peakMemory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    completed = [result for result in results if "error" not in result]
+    latencies = [result["latency"] for result in completed]
+    firstTokens = [result["firstToken"] for result in completed]
+    return {
+        "sessions": args.sessions,
+        "requests": len(results),
+        "errors": len(results) - len(completed),
+        "elapsed": round(elapsedTime, 4),
+        "throughput": round(len(completed) / elapsedTime, 4) if elapsedTime else 0.0,
+        "latency": {name: round(percentile(latencies, fraction), 4) for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99))},
+        "meanLatency": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        "firstToken": {name: round(percentile(firstTokens, fraction), 4) for name, fraction in (("p50", 0.5), ("p95", 0.95))},
+        "tokensPerRequest": round(sum(result["tokens"] for result in completed) / len(completed), 1) if completed else 0.0,
+        "peakMemoryBytes": peakMemory,
+        "approximateTokens": args.approximateTokens,
+        "providerCalls": replay.calls,
+        "llmCalls": newsV6.model.calls,
+        "stages": newsV6.METRICS.summary(),
+        "errorSamples": [result["error"] for result in results if "error" in result][:5]
+    }
+
+def compare(report, baseline, tolerance):
+    """Names of the measurements that got worse than baseline by more than tolerance."""
+    regressions = []
+    checks = (("latency p95", report["latency"]["p95"], baseline["latency"]["p95"], True),
+              ("throughput", report["throughput"], baseline["throughput"], False),
+              ("tokensPerRequest", report["tokensPerRequest"], baseline["tokensPerRequest"], True),
+              ("peakMemoryBytes", report["peakMemoryBytes"], baseline.get("peakMemoryBytes"), True))
+    for name, current, previous, lowerIsBetter in checks:
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (change > tolerance) if lowerIsBetter else (-change > tolerance):
+            regressions.append(f"{name}: {previous} -> {current} ({change:+.1%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the newsV6 pipeline on recorded provider responses")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent chat sessions")
+    parser.add_argument("--requests", type=int, default=5, help="queries per session")
+    parser.add_argument("--queries", default=os.path.join(FIXTURES_PATH, "queries.jsonl"))
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("--provider-latency", type=float, default=0.15)
+    parser.add_argument("--provider-jitter", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="seconds before the first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--llm-output-tokens", type=int, default=150)
+    parser.add_argument("--approximate-tokens", action="store_true", help="count four characters as a token instead of loading tiktoken")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the providers' real rate limits and quotas")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false", help="skip memory tracing, which slows Python down")
+    parser.add_argument("--trace-log", default="", help="where spans are logged, empty for nowhere")
+    parser.add_argument("--output", help="write the report here, usable later as a baseline")
+    parser.add_argument("--baseline", help="report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression before failing")
+    args = parser.parse_args(argv)
+    report = run_benchmark(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,100 @@
+import os
+import threading
+from langchain.schema import HumanMessage, SystemMessage
+from tokenCounter import count_tokens, truncate_tokens
+
+KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", 2))
+TOKEN_CEILING = int(os.getenv("CHAT_TOKEN_CEILING", 30000))
+MEMO_ANSWER_TOKENS = int(os.getenv("CHAT_MEMO_ANSWER_TOKENS", 150))
+MEMO_TOKENS = int(os.getenv("CHAT_MEMO_TOKENS", 2000))
+
+class ChatHistory:
+    """Chat messages with each message's token count cached once at append time.
+
+    Only the last keepTurns turns keep their raw articles. Older turns keep the user's
+    prompt and the generated summary, and once the history passes tokenCeiling the
+    oldest turns are folded into a short memo message.
+    """
+
+    def __init__(self, messages=None, keepTurns=KEEP_TURNS, tokenCeiling=TOKEN_CEILING):
+        self.messages = []
+        self.tokenCounts = []
+        self.prompts = []
+        self.memoIndex = None
+        self.promptTokens = 0
+        self.usedTokens = 0
+        self.keepTurns = keepTurns
+        self.tokenCeiling = tokenCeiling
+        self.lock = threading.RLock()
+        for message in messages or []:
+            self.append(message)
+
+    def append(self, message, tokens=None, prompt=None):
+        if tokens is None:
+            tokens = count_tokens(message.content)
+        with self.lock:
+            self.messages.append(message)
+            self.tokenCounts.append(tokens)
+            self.prompts.append(prompt)
+            self.promptTokens += tokens
+
+    def append_query(self, prompt, articlesText):
+        self.append(HumanMessage(content=prompt+'\n\n'+articlesText), prompt=prompt)
+
+    def add_usage(self, tokens):
+        with self.lock:
+            self.usedTokens += tokens
+
+    def replace(self, index, message):
+        tokens = count_tokens(message.content)
+        self.promptTokens += tokens - self.tokenCounts[index]
+        self.messages[index] = message
+        self.tokenCounts[index] = tokens
+
+    def turn_starts(self):
+        return [i for i, message in enumerate(self.messages) if isinstance(message, HumanMessage)]
+
+    def compact(self):
+        with self.lock:
+            turnStarts = self.turn_starts()
+            oldTurns = turnStarts[:-self.keepTurns] if self.keepTurns else turnStarts
+            for index in oldTurns:
+                prompt = self.prompts[index]
+                if prompt is not None and self.messages[index].content != prompt:
+                    self.replace(index, HumanMessage(content=prompt+"\n\n[articles omitted, see the summary that followed]"))
+            while self.promptTokens > self.tokenCeiling and len(self.turn_starts()) > self.keepTurns:
+                self.fold_oldest_turn()
+
+    def fold_oldest_turn(self):
+        turnStarts = self.turn_starts()
+        start = turnStarts[0]
+        end = turnStarts[1] if len(turnStarts) > 1 else len(self.messages)
+        question = self.prompts[start] or self.messages[start].content
+        answers = ' '.join(message.content for message in self.messages[start + 1:end])
+        line = f"- User asked: {question}\n  You answered: {truncate_tokens(answers, MEMO_ANSWER_TOKENS)}"
+        del self.messages[start:end]
+        self.promptTokens -= sum(self.tokenCounts[start:end])
+        del self.tokenCounts[start:end]
+        del self.prompts[start:end]
+        if self.memoIndex is None:
+            self.memoIndex = start
+            self.messages.insert(start, SystemMessage(content="Earlier in this conversation:"))
+            self.tokenCounts.insert(start, count_tokens(self.messages[start].content))
+            self.prompts.insert(start, None)
+            self.promptTokens += self.tokenCounts[start]
+        elif self.memoIndex > start:
+            self.memoIndex -= end - start
+        lines = self.messages[self.memoIndex].content.split("\n- ")
+        lines.append(line[2:])
+        while len(lines) > 2 and count_tokens("\n- ".join(lines)) > MEMO_TOKENS:
+            del lines[1]
+        self.replace(self.memoIndex, SystemMessage(content="\n- ".join(lines)))
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
@@ -0,0 +1,87 @@
+import os
+import asyncio
+import contextvars
+import threading
+import concurrent.futures
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+HOST_LIMIT = int(os.getenv("FETCH_HOST_LIMIT", 4))
+MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", 16))
+DEFAULT_DEADLINE = float(os.getenv("FETCH_DEADLINE", 20))
+
+SESSIONS = {}
+#per host limit shared by every thread and event loop of the process, held only while a request is on the wire
+HOST_SLOTS = {}
+SESSIONS_LOCK = threading.Lock()
+#one bounded pool for every blocking HTTP call, however many requests fan out at once
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fetch")
+#follow-up pages are fetched from inside EXECUTOR jobs, so they need their own pool to never wait on themselves
+PAGE_PARALLELISM = int(os.getenv("FETCH_PAGE_PARALLELISM", 4))
+PAGE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=PAGE_PARALLELISM, thread_name_prefix="page")
+
+def get_session(url):
+    host = urlparse(url).netloc
+    with SESSIONS_LOCK:
+        if host not in SESSIONS:
+            session = requests.Session()
+            #pool_block keeps connections over the limit from being opened and thrown away after one request
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HOST_LIMIT, pool_block=True)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            SESSIONS[host] = session
+            HOST_SLOTS[host] = threading.BoundedSemaphore(HOST_LIMIT)
+        return SESSIONS[host], HOST_SLOTS[host]
+
+def http_get(url, params=None, timeout=None):
+    session, slots = get_session(url)
+    with slots:
+        return session.get(url, params=params, timeout=timeout)
+
+def make_job(url, func, *args):
+    return (urlparse(url).netloc, func, args)
+
+async def iter_jobs(jobs, deadline=DEFAULT_DEADLINE):
+    """Yields (job, result) pairs as they complete, dropping failures and anything past the deadline."""
+    loop = asyncio.get_running_loop()
+
+    async def run(job):
+        _, func, args = job
+        #copy the context so spans started by func nest under the caller's span
+        return await loop.run_in_executor(EXECUTOR, contextvars.copy_context().run, func, *args)
+
+    tasks = {asyncio.ensure_future(run(job)): job for job in jobs}
+    pending = set(tasks)
+    endTime = loop.time() + deadline
+    try:
+        while pending:
+            remaining = endTime - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    print(f"Fetch failed for {tasks[task][0]}: {task.exception()}")
+                    continue
+                yield tasks[task], task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"{len(pending)} fetch(es) missed the {deadline}s deadline")
+
+async def run_jobs(jobs, deadline=DEFAULT_DEADLINE):
+    return [(job, result) async for job, result in iter_jobs(jobs, deadline)]
+
+def run_sync(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    #already inside an event loop, so drive a private one from a helper thread
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(contextvars.copy_context().run, asyncio.run, coroutine).result()
+
+def run_jobs_sync(jobs, deadline=DEFAULT_DEADLINE):
+    return run_sync(run_jobs(jobs, deadline))
@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from filterParser import CATEGORY_NAMES, COUNTRIES, LANGUAGES, MONTHS, find_categories, find_code
+
+CACHE_PATH = os.getenv("FILTER_CACHE_PATH", "filterCache.json")
+MAX_ENTRIES = int(os.getenv("FILTER_CACHE_SIZE", 512))
+SIMILARITY_THRESHOLD = float(os.getenv("FILTER_CACHE_SIMILARITY", 0.8))
+
+#words that say nothing about what the user wants beyond "give me news"
+STOP_WORDS = {"a", "an", "the", "and", "or", "of", "on", "in", "at", "to", "for", "from", "with", "about", "any", "there", "been",
+              "is", "are", "was", "were", "be", "have", "has", "had", "do", "does", "did", "doing", "what", "whats", "what's", "how", "hows",
+              "how's", "me", "my", "i", "us", "we", "you", "please", "can", "could", "would", "show", "give", "tell", "get", "find",
+              "summarize", "summarise", "summary", "news", "headline", "headlines", "top", "stories", "story", "articles", "article",
+              "latest", "recent", "recently", "current", "happening", "going", "up", "today", "todays", "today's"}
+
+DATE_WORDS = {"yesterday", "ago", "day", "days", "week", "weeks", "last", "past", "this", "month", "year", "since", "until", "between"}
+
+NUMBER_WORDS = {"one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve", "fifteen",
+                "twenty", "thirty", "couple", "few"}
+
+CATEGORY_WORDS = {name for names in CATEGORY_NAMES.values() for name in names}
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def make_signature(userInput):
+    """Splits a query into anchors that must match exactly and free text compared by similarity."""
+    text = userInput.lower()
+    words = tokenize(text)
+    known = set(MONTHS)
+    for table in (COUNTRIES, LANGUAGES):
+        for names in table.values():
+            for name in names:
+                known.update(name.split())
+    categories = find_categories(text)
+    for category in categories:
+        if isinstance(category, dict):
+            known.update(tokenize(list(category.values())[0]))
+    dateTerms = [word for word in words if word in DATE_WORDS or word in NUMBER_WORDS or word in MONTHS or word.isdigit()]
+    anchors = json.dumps({
+        "categories": sorted(json.dumps(category, sort_keys=True) for category in categories),
+        "country": find_code(text, COUNTRIES),
+        "language": find_code(text, LANGUAGES),
+        "dates": dateTerms
+    }, sort_keys=True)
+    residual = [word for word in words if word not in STOP_WORDS and word not in known and word not in dateTerms and word not in CATEGORY_WORDS]
+    absolute = any((word.isdigit() and len(word) == 4) or word in MONTHS for word in dateTerms)
+    return anchors, " ".join(residual), absolute
+
+def ngram_vector(text):
+    padded = f" {text} "
+    vector = Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+    vector.update(text.split())
+    return vector
+
+def similarity(first, second):
+    if not first and not second:
+        return 1.0
+    a, b = ngram_vector(first), ngram_vector(second)
+    dot = sum(count * b[gram] for gram, count in a.items())
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm if norm else 0.0
+
+def restamp_dates(filters, storedDate, today):
+    shift = (today - storedDate).days
+    if shift == 0 or not isinstance(filters.get("date"), list):
+        return filters
+    filters = dict(filters)
+    filters["date"] = [(datetime.strptime(date[:10], "%Y-%m-%d") + timedelta(days=shift)).strftime("%Y-%m-%d") for date in filters["date"]]
+    return filters
+
+class FilterCache:
+    def __init__(self, path=CACHE_PATH, maxEntries=MAX_ENTRIES, threshold=SIMILARITY_THRESHOLD):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self.entries = OrderedDict()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for entry in json.load(f):
+                    self.entries[(entry["anchors"], entry["text"])] = entry
+
+    def lookup(self, userInput, today=None):
+        """Returns the cached filter JSON string for a close enough past query, or None."""
+        today = today or datetime.today()
+        today = datetime(today.year, today.month, today.day)
+        anchors, text, absolute = make_signature(userInput)
+        with self.lock:
+            best, bestScore = None, 0.0
+            for key, entry in self.entries.items():
+                if key[0] != anchors:
+                    continue
+                score = similarity(text, key[1])
+                if score > bestScore:
+                    best, bestScore = key, score
+            if best is None or bestScore < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.entries.move_to_end(best)
+            entry = self.entries[best]
+        filters = entry["filters"]
+        if not absolute:
+            filters = restamp_dates(filters, datetime.strptime(entry["storedDate"], "%Y-%m-%d"), today)
+        return json.dumps(filters)
+
+    def store(self, userInput, filtersText):
+        try:
+            filters = json.loads(filtersText)
+        except (TypeError, ValueError):
+            return
+        anchors, text, absolute = make_signature(userInput)
+        with self.lock:
+            self.entries[(anchors, text)] = {
+                "anchors": anchors,
+                "text": text,
+                "filters": filters,
+                "storedDate": datetime.today().strftime("%Y-%m-%d")
+            }
+            self.entries.move_to_end((anchors, text))
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tempPath = self.path + ".tmp"
+        with open(tempPath, "w", encoding="utf-8") as f:
+            json.dump(list(self.entries.values()), f)
+        os.replace(tempPath, self.path)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hitRate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,200 @@
+import re
+from datetime import datetime, timedelta
+from word2number import w2n
+
+CATEGORY_NAMES = {
+    "business": ["business", "businesses", "busness"],
+    "entertainment": ["entertainment"],
+    "general": ["general"],
+    "health": ["health"],
+    "science": ["science", "scientific"],
+    "sports": ["sport", "sports"],
+    "technology": ["technology", "tech"]
+}
+
+CATEGORY_KEYWORDS = {
+    "business": ["economy", "economic", "market", "markets", "stock", "stocks", "finance", "financial", "earnings", "trade", "inflation", "startup", "startups"],
+    "entertainment": ["movie", "movies", "film", "films", "music", "celebrity", "celebrities", "tv", "hollywood", "netflix", "oscars", "concert"],
+    "general": ["politics", "political", "election", "elections", "government", "world", "war", "weather"],
+    "health": ["covid", "vaccine", "vaccines", "medical", "medicine", "disease", "hospital", "fitness", "nutrition", "mental health"],
+    "science": ["space", "nasa", "climate", "research", "physics", "biology", "chemistry", "astronomy"],
+    "sports": ["football", "soccer", "basketball", "nba", "nfl", "tennis", "volleyball", "baseball", "hockey", "cricket", "golf", "olympics", "formula 1", "f1"],
+    "technology": ["ai", "artificial intelligence", "software", "video game", "video games", "gaming", "apple", "google", "microsoft", "crypto", "cybersecurity", "smartphone", "smartphones"]
+}
+
+COUNTRIES = {
+    "us": ["usa", "united states", "america"],
+    "gb": ["uk", "united kingdom", "britain", "england"],
+    "ru": ["russia"],
+    "de": ["germany"],
+    "fr": ["france"],
+    "it": ["italy"],
+    "es": ["spain"],
+    "cn": ["china"],
+    "jp": ["japan"],
+    "in": ["india"],
+    "ca": ["canada"],
+    "au": ["australia"],
+    "br": ["brazil"],
+    "mx": ["mexico"],
+    "ua": ["ukraine"],
+    "il": ["israel"]
+}
+
+LANGUAGES = {
+    "en": ["english"],
+    "es": ["spanish"],
+    "fr": ["french"],
+    "de": ["german"],
+    "it": ["italian"],
+    "pt": ["portuguese"],
+    "ru": ["russian"],
+    "zh": ["chinese"],
+    "ja": ["japanese"],
+    "ar": ["arabic"]
+}
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+
+FILLER_WORDS = {"a": 1, "an": 1, "one": 1, "couple": 2, "a couple": 2, "couple of": 2, "a couple of": 2, "few": 3, "a few": 3}
+
+#words that mean there is a date or topic in the query this parser does not understand
+UNSUPPORTED_HINTS = ["month", "year", "since", "between", "until", "weekend", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday", "ago", "earlier"]
+
+#capitalized words that are safe to ignore when looking for unknown named entities
+KNOWN_WORDS = {"i", "what", "what's", "whats", "show", "give", "tell", "summarize", "summarise", "any", "are", "is", "were", "was", "have", "has", "how", "how's", "hows", "news", "headline", "headlines", "top", "the", "in", "from", "today", "yesterday", "please", "can", "could", "latest", "get", "find", "me", "and"}
+
+def find_phrases(text, phrases):
+    return [phrase for phrase in phrases if re.search(r'\b' + re.escape(phrase) + r'\b', text)]
+
+def find_categories(text):
+    categories = []
+    explicit = set()
+    for category, names in CATEGORY_NAMES.items():
+        if find_phrases(text, names):
+            categories.append(category)
+            explicit.add(category)
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        matches = find_phrases(text, keywords)
+        #drop single words already covered by a longer phrase, e.g. "video game" inside "video games"
+        matches = [word for word in matches if not any(word != other and word in other for other in matches)]
+        if matches and category not in explicit:
+            categories.append({category: ", ".join(matches)})
+    return categories
+
+def count_from_words(word):
+    word = word.strip()
+    if word.isnumeric():
+        return int(word)
+    if word in FILLER_WORDS:
+        return FILLER_WORDS[word]
+    try:
+        return w2n.word_to_num(word)
+    except ValueError:
+        return None
+
+def parse_month_day(monthName, day, year, today):
+    month = MONTHS.index(monthName) + 1
+    date = datetime(int(year) if year else today.year, month, int(day))
+    if not year and date > today:
+        date = date.replace(year=today.year - 1)
+    return date
+
+def parse_month(monthName, year, today):
+    """First and last day of a month, the most recent one when there is no year, never past today."""
+    month = MONTHS.index(monthName) + 1
+    first = datetime(int(year) if year else today.year, month, 1)
+    if not year and first > today:
+        first = first.replace(year=today.year - 1)
+    last = datetime(first.year + first.month // 12, first.month % 12 + 1, 1) - timedelta(days=1)
+    return [first, min(last, today)]
+
+def find_dates(text, today):
+    dates = []
+    handled = False
+    for match in re.finditer(r'\b(\d{4})[-/](\d{1,2})[-/](\d{1,2})\b', text):
+        dates.append(datetime(int(match[1]), int(match[2]), int(match[3])))
+    for match in re.finditer(r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b', text):
+        dates.append(datetime(int(match[3]), int(match[1]), int(match[2])))
+    monthPattern = r'\b(' + '|'.join(MONTHS) + r')\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b'
+    for match in re.finditer(monthPattern, text):
+        dates.append(parse_month_day(match[1], match[2], match[3], today))
+    #a month without a day, only after a preposition or with a year so the verb "may" is not taken for a date
+    monthOnlyPattern = r'\b(?:(in|during|from|for|of|since|to|through|until|last|this)\s+)?(' + '|'.join(MONTHS) + r')\b(?!\s+\d{1,2}(?:st|nd|rd|th)?\b)(?:,?\s+(\d{4}))?'
+    for match in re.finditer(monthOnlyPattern, text):
+        if match[1] == "since":
+            dates += [parse_month(match[2], match[3], today)[0], today]
+        elif match[1] or match[3]:
+            dates += parse_month(match[2], match[3], today)
+    if dates:
+        handled = True
+    numberWords = r'(\d+|[a-z]+(?:[\s-][a-z]+)?)'
+    for match in re.finditer(numberWords + r'\s+(day|days|week|weeks)\s+ago\b', text):
+        count = count_from_words(match[1])
+        if count is not None:
+            days = count * 7 if match[2].startswith("week") else count
+            dates.append(today - timedelta(days=days))
+            handled = True
+    for match in re.finditer(r'\b(?:last|past)\s+' + numberWords + r'\s+(day|days|week|weeks)\b', text):
+        count = count_from_words(match[1])
+        if count is not None:
+            days = count * 7 if match[2].startswith("week") else count
+            dates += [today - timedelta(days=days), today]
+            handled = True
+    if re.search(r'\b(?:last|past|this)\s+week\b', text):
+        dates += [today - timedelta(days=7), today]
+        handled = True
+    if re.search(r'\byesterday\b', text):
+        dates.append(today - timedelta(days=1))
+        handled = True
+    if re.search(r'\btoday\b', text):
+        handled = True
+    if not dates:
+        dates.append(today)
+    dates = sorted(set(date.strftime("%Y-%m-%d") for date in dates))
+    if len(dates) > 2:
+        dates = [dates[0], dates[-1]]
+    return dates, handled
+
+def find_code(text, table):
+    for code, names in table.items():
+        if find_phrases(text, names):
+            return code
+    return ""
+
+def unknown_entities(userInput):
+    words = re.findall(r"[A-Za-z][\w'&.-]*", userInput)
+    known = set(KNOWN_WORDS)
+    for table in (CATEGORY_NAMES, CATEGORY_KEYWORDS, COUNTRIES, LANGUAGES):
+        for names in table.values():
+            for name in names:
+                known.update(name.split())
+    known.update(MONTHS)
+    return [word for word in words[1:] if word[0].isupper() and word.lower() not in known]
+
+def parse_filters(userInput, today=None):
+    """Returns (filters, confidence) in the same shape get_filters asks GPT-4 for."""
+    today = today or datetime.today()
+    today = datetime(today.year, today.month, today.day)
+    text = userInput.lower()
+    confidence = 1.0
+    categories = find_categories(text)
+    if not categories:
+        confidence *= 0.3
+    try:
+        dates, handled = find_dates(text, today)
+    except ValueError:
+        dates, handled = [today.strftime("%Y-%m-%d")], False
+        confidence *= 0.3
+    #a month name that find_dates could not turn into dates is as much a date it missed as "since" or "ago"
+    if not handled and find_phrases(text, UNSUPPORTED_HINTS + MONTHS):
+        confidence *= 0.4
+    if unknown_entities(userInput):
+        confidence *= 0.4
+    filters = {
+        "categories": categories,
+        "date": dates,
+        "language": find_code(text, LANGUAGES),
+        "country": find_code(text, COUNTRIES)
+    }
+    return filters, confidence
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+from newsApis import NEWS_APIS, BASE_URL_VARIABLES
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+HOST = os.getenv("MOCK_PROVIDER_HOST", "127.0.0.1")
+PORT = int(os.getenv("MOCK_PROVIDER_PORT", 8900))
+#"fixtures" replays the recorded responses, "synthetic" generates SYNTHETIC_SIZE articles per category
+CORPUS = os.getenv("MOCK_PROVIDER_CORPUS", "fixtures")
+SYNTHETIC_SIZE = int(os.getenv("MOCK_PROVIDER_SYNTHETIC_SIZE", 50))
+LATENCY = float(os.getenv("MOCK_PROVIDER_LATENCY", 0.15))
+JITTER = float(os.getenv("MOCK_PROVIDER_JITTER", 0.05))
+#share of responses that take SLOW_LATENCY instead, to reproduce a provider's long tail
+SLOW_RATE = float(os.getenv("MOCK_PROVIDER_SLOW_RATE", 0.02))
+SLOW_LATENCY = float(os.getenv("MOCK_PROVIDER_SLOW_LATENCY", 3))
+RATE_LIMIT_RATE = float(os.getenv("MOCK_PROVIDER_429_RATE", 0.02))
+ERROR_RATE = float(os.getenv("MOCK_PROVIDER_ERROR_RATE", 0.01))
+
+CATEGORIES = ["business", "entertainment", "general", "health", "sports", "science", "technology"]
+SYNTHETIC_WORDS = ("officials analysts market policy growth results team company researchers statement week year people plans "
+                   "impact support change public figures industry report data election storm match season launch study").split()
+
+def load_fixtures(path=FIXTURES_PATH):
+    """{provider: {endpoint: response body}} from every recorded provider file."""
+    fixtures = {}
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".json"):
+            with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+                recorded = json.load(f)
+            fixtures[recorded["provider"]] = recorded["endpoints"]
+    return fixtures
+
+def synthetic_fixtures(newsApis, size=SYNTHETIC_SIZE, seed=0):
+    """Generated articles in each provider's response format, size per category and endpoint."""
+    rnd = random.Random(seed)
+    fixtures = {}
+    for news in newsApis:
+        endpoints = {}
+        for url in (news["headLineUrl"], news["storiesUrl"]):
+            endpoint = urlsplit(url).path.rsplit("/", 1)[-1]
+            articles = []
+            for category in CATEGORIES:
+                for i in range(size):
+                    title = f"{category.capitalize()} story {i}: " + ' '.join(rnd.choice(SYNTHETIC_WORDS) for _ in range(6))
+                    content = ' '.join(rnd.choice(SYNTHETIC_WORDS) for _ in range(rnd.randint(40, 90)))
+                    url = f"https://source{i % 12}.example.com/{category}/{endpoint}-{i}"
+                    articles.append({"title": title, "author": f"Source {i % 12}", "description": content[:120], "content": content,
+                                     "url": url, "publishedAt": None, "source": {"name": f"Source {i % 12}"}, "_category": category})
+            endpoints[endpoint] = {news["totalKey"]: len(articles), "articles": articles}
+        fixtures[news["name"]] = endpoints
+    return fixtures
+
+class ProviderCorpus:
+    """Answers provider requests from a corpus the way NewsAPI and GNews would.
+
+    Articles are filtered to the requested category or query words, paged with the provider's
+    own parameters, and restamped inside the requested dates.
+    """
+
+    def __init__(self, newsApis, fixtures):
+        self.endpoints = {}
+        for news in newsApis:
+            for endpoint, body in fixtures.get(news["name"], {}).items():
+                self.endpoints[(news["name"], endpoint)] = (news, body["articles"])
+
+    def select(self, news, articles, params):
+        category = params.get(news["categoryParam"])
+        words = [word.strip('"').lower() for word in params.get("q", "").replace(" OR ", " ").split() if word.strip('"')]
+        if category:
+            selected = [article for article in articles if article.get("_category") == category]
+        else:
+            selected = [article for article in articles
+                        if article.get("_category") in words or any(word in f"{article['title']} {article.get('content')}".lower() for word in words)]
+        return selected or articles
+
+    def restamp(self, articles, news, params):
+        end = datetime.now(timezone.utc)
+        if params.get(news["toDateParam"]):
+            end = min(end, datetime.fromisoformat(params[news["toDateParam"]][:10]).replace(tzinfo=timezone.utc) + timedelta(hours=23))
+        start = end - timedelta(hours=23)
+        if params.get(news["fromDateParam"]):
+            start = min(end, datetime.fromisoformat(params[news["fromDateParam"]][:10]).replace(tzinfo=timezone.utc))
+        step = (end - start) / max(len(articles), 1)
+        stamped = []
+        for i, article in enumerate(articles):
+            article = {key: value for key, value in article.items() if key != "_category"}
+            article["publishedAt"] = (end - step * i).strftime("%Y-%m-%dT%H:%M:%SZ")
+            stamped.append(article)
+        return stamped
+
+    def respond(self, provider, endpoint, params):
+        """(status, body) for one request, params as the provider would receive them."""
+        news, articles = self.endpoints.get((provider, endpoint), (None, None))
+        if news is None:
+            return 404, {"status": "error", "message": f"{provider} has no {endpoint} endpoint"}
+        try:
+            page = int(params.get(news["pageParam"], 1))
+            pageSize = min(int(params.get(news["pageSizeParam"], news["maxPageSize"])), news["maxPageSize"])
+        except ValueError:
+            return 400, {"status": "error", "message": "page and page size must be numbers"}
+        selected = self.select(news, articles, params)
+        pageArticles = self.restamp(selected[(page - 1) * pageSize:page * pageSize], news, params)
+        return 200, {news["totalKey"]: len(selected), "articles": pageArticles}
+
+class FaultProfile:
+    """Latency and failure distribution shared by every request the mock serves."""
+
+    def __init__(self, latency=LATENCY, jitter=JITTER, slowRate=SLOW_RATE, slowLatency=SLOW_LATENCY,
+                 rateLimitRate=RATE_LIMIT_RATE, errorRate=ERROR_RATE, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.slowRate = slowRate
+        self.slowLatency = slowLatency
+        self.rateLimitRate = rateLimitRate
+        self.errorRate = errorRate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        """(delay seconds, forced status or None) for the next request."""
+        with self.lock:
+            roll = self.random.random()
+            slow = self.random.random() < self.slowRate
+            delay = self.slowLatency if slow else max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0)
+        if roll < self.rateLimitRate:
+            return delay, 429
+        if roll < self.rateLimitRate + self.errorRate:
+            return delay, 503
+        return delay, None
+
+class MockProviderServer:
+    """ThreadingHTTPServer serving every NEWS_APIS provider under /<provider name lowercased>/..."""
+
+    def __init__(self, newsApis=NEWS_APIS, corpus=None, faults=None, host=HOST, port=PORT):
+        self.newsApis = newsApis
+        self.corpus = corpus or ProviderCorpus(newsApis, load_fixtures() if CORPUS == "fixtures" else synthetic_fixtures(newsApis))
+        self.faults = faults or FaultProfile()
+        self.stats = {"requests": 0, "429": 0, "5xx": 0, "slow": 0}
+        self.statsLock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                segments = [segment for segment in parts.path.split("/") if segment]
+                news = next((news for news in mock.newsApis if segments and segments[0] == news["name"].lower()), None)
+                delay, forced = mock.faults.sample()
+                with mock.statsLock:
+                    mock.stats["requests"] += 1
+                    if delay >= mock.faults.slowLatency:
+                        mock.stats["slow"] += 1
+                time.sleep(delay)
+                if forced is not None:
+                    with mock.statsLock:
+                        mock.stats["429" if forced == 429 else "5xx"] += 1
+                    self.send_json(forced, {"status": "error", "message": "Too many requests" if forced == 429 else "Service unavailable"},
+                                   {"Retry-After": "1"} if forced == 429 else {})
+                    return
+                if news is None:
+                    self.send_json(404, {"status": "error", "message": f"No provider at {parts.path}"})
+                    return
+                params = dict(parse_qsl(parts.query))
+                if not params.get(news["apiKeyParam"]):
+                    self.send_json(401, {"status": "error", "message": "Your API key is missing."})
+                    return
+                status, body = mock.corpus.respond(news["name"], segments[-1], params)
+                self.send_json(status, body)
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def base_urls(self):
+        """The base url environment variables that point the pipeline at this server."""
+        host, port = self.server.server_address[:2]
+        urls = {}
+        for news in self.newsApis:
+            variable = BASE_URL_VARIABLES.get(news["name"])
+            if variable is None:
+                continue
+            #keep the provider's own path after the host, e.g. /v2 or /api/v4
+            basePath = urlsplit(news["headLineUrl"]).path.rsplit("/", 1)[0]
+            urls[variable] = f"http://{host}:{port}/{news['name'].lower()}{basePath}"
+        return urls
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-provider", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the NEWS_APIS providers")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--corpus", choices=["fixtures", "synthetic"], default=CORPUS)
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("--synthetic-size", type=int, default=SYNTHETIC_SIZE)
+    parser.add_argument("--latency", type=float, default=LATENCY)
+    parser.add_argument("--jitter", type=float, default=JITTER)
+    parser.add_argument("--slow-rate", type=float, default=SLOW_RATE)
+    parser.add_argument("--slow-latency", type=float, default=SLOW_LATENCY)
+    parser.add_argument("--rate-limit-rate", type=float, default=RATE_LIMIT_RATE)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    fixtures = load_fixtures(args.fixtures) if args.corpus == "fixtures" else synthetic_fixtures(NEWS_APIS, args.synthetic_size)
+    faults = FaultProfile(args.latency, args.jitter, args.slow_rate, args.slow_latency, args.rate_limit_rate, args.error_rate, args.seed)
+    mock = MockProviderServer(NEWS_APIS, ProviderCorpus(NEWS_APIS, fixtures), faults, args.host, args.port)
+    print("Mock providers listening, point the pipeline at them with:")
+    for variable, url in mock.base_urls().items():
+        print(f"{variable}={url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        print(mock.stats)
+    finally:
+        mock.server.server_close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
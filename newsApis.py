@@ -0,0 +1,59 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#point these at mockProvider.py (or any stand-in) to run without the real providers
+NEWSAPI_BASE_URL = os.getenv("NEWSAPI_BASE_URL", "https://newsapi.org/v2").rstrip("/")
+G_NEWS_BASE_URL = os.getenv("G_NEWS_BASE_URL", "https://gnews.io/api/v4").rstrip("/")
+BASE_URL_VARIABLES = {"NewsApi": "NEWSAPI_BASE_URL", "GNews": "G_NEWS_BASE_URL"}
+
+NEWS_APIS = [
+    {
+        "name":"NewsApi",
+        "headLineUrl":f"{NEWSAPI_BASE_URL}/top-headlines",
+        "storiesUrl":f"{NEWSAPI_BASE_URL}/everything",
+        "categoryParam":"category",
+        "apiKeyParam":"apiKey",
+        "fromDateParam":"from",
+        "toDateParam":"to",
+        "languageParam":"language",
+        "countryParam":"country",
+        "connectTimeout":3.05,
+        "readTimeout":10,
+        "retries":2,
+        "ratePerSecond":5,
+        "dailyQuota":int(os.getenv("NEWSAPI_DAILY_QUOTA", 100)),
+        "pageParam":"page",
+        "pageSizeParam":"pageSize",
+        "maxPageSize":int(os.getenv("NEWSAPI_PAGE_SIZE", 100)),
+        #pages read per range query, each one costs a request of the daily quota
+        "maxPages":int(os.getenv("NEWSAPI_MAX_PAGES", 5)),
+        "totalKey":"totalResults",
+        "apiKeys":[key for key in os.getenv("NEWSAPI_API_KEYS", "").split(",") if key],
+        "apiKey":os.getenv("NEWSAPI_API_KEY")
+    },
+    {
+        "name":"GNews",
+        "headLineUrl":f"{G_NEWS_BASE_URL}/top-headlines",
+        "storiesUrl":f"{G_NEWS_BASE_URL}/search",
+        "categoryParam":"category",
+        "apiKeyParam":"apikey",
+        "fromDateParam":"from",
+        "toDateParam":"to",
+        "languageParam":"lang",
+        "countryParam":"country",
+        "connectTimeout":3.05,
+        "readTimeout":10,
+        "retries":2,
+        "ratePerSecond":1,
+        "dailyQuota":int(os.getenv("G_NEWS_DAILY_QUOTA", 100)),
+        "pageParam":"page",
+        "pageSizeParam":"max",
+        "maxPageSize":int(os.getenv("G_NEWS_PAGE_SIZE", 10)),
+        "maxPages":int(os.getenv("G_NEWS_MAX_PAGES", 2)),
+        "totalKey":"totalArticles",
+        "apiKeys":[key for key in os.getenv("G_NEWS_KEYS", "").split(",") if key],
+        "apiKey":os.getenv("G_NEWS_KEY")
+    }    
+]
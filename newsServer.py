@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import concurrent.futures
+from urllib.parse import urlsplit
+from langchain.schema import AIMessage, SystemMessage
+from chatHistory import ChatHistory
+from rateLimiter import quota_usage
+from tracing import span, render_metrics
+import newsV6
+
+HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+PORT = int(os.getenv("SERVER_PORT", 8080))
+#requests summarized at the same time, each one holds a worker thread for its whole run
+WORKERS = int(os.getenv("SERVER_WORKERS", 8))
+#requests allowed to wait for a worker before new ones are turned away with 503
+MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", 32))
+QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", 30))
+READ_TIMEOUT = float(os.getenv("SERVER_READ_TIMEOUT", 10))
+SESSION_TTL = float(os.getenv("SERVER_SESSION_TTL", 30 * 60))
+MAX_BODY = 64 * 1024
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable"
+}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class Session:
+    def __init__(self, sessionId):
+        self.sessionId = sessionId
+        self.chatHistory = ChatHistory([SystemMessage(content=newsV6.SYSTEM_PROMPT)])
+        self.usedCategories = []
+        self.requests = 0
+        #one question at a time per conversation, the next one builds on the previous answer
+        self.lock = asyncio.Lock()
+        self.lastSeen = time.monotonic()
+
+    def usage(self):
+        return {
+            "sessionId": self.sessionId,
+            "requests": self.requests,
+            "usedTokens": self.chatHistory.usedTokens,
+            "promptTokens": self.chatHistory.promptTokens,
+            "turns": len(self.chatHistory.turn_starts())
+        }
+
+class NewsServer:
+    """JSON API hosting many chat sessions in one process.
+
+    Sessions share the provider pools, caches and LLM client of newsV6. At most workers requests run
+    at once on a fixed thread pool, up to maxQueue more wait for a slot and anything beyond gets a 503.
+    """
+
+    def __init__(self, workers=WORKERS, maxQueue=MAX_QUEUE, queueTimeout=QUEUE_TIMEOUT, sessionTtl=SESSION_TTL, handler=None):
+        self.workers = workers
+        self.maxQueue = maxQueue
+        self.queueTimeout = queueTimeout
+        self.sessionTtl = sessionTtl
+        self.handler = handler or newsV6.get_handler()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="news-worker")
+        self.slots = asyncio.Semaphore(workers)
+        self.sessions = {}
+        self.stats = {"admitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self.inFlight = 0
+
+    def get_session(self, sessionId=None, create=False):
+        if sessionId in self.sessions:
+            session = self.sessions[sessionId]
+        elif create:
+            session = Session(sessionId or uuid.uuid4().hex)
+            self.sessions[session.sessionId] = session
+        else:
+            raise HttpError(404, f"Unknown session {sessionId}")
+        session.lastSeen = time.monotonic()
+        return session
+
+    def expire_sessions(self):
+        cutoff = time.monotonic() - self.sessionTtl
+        for sessionId, session in list(self.sessions.items()):
+            if session.lastSeen < cutoff and not session.lock.locked():
+                del self.sessions[sessionId]
+
+    def run_query(self, session, query):
+        startTokens = session.chatHistory.usedTokens
+        with span("request", sessionId=session.sessionId) as trace:
+            summary = self.handler(query, session.chatHistory, session.usedCategories)
+            trace.set(tokens=session.chatHistory.usedTokens - startTokens)
+        session.chatHistory.append(AIMessage(content=summary))
+        return summary, session.chatHistory.usedTokens - startTokens
+
+    async def query(self, payload):
+        query = payload.get("query") or payload.get("userInput")
+        if not isinstance(query, str) or not query.strip():
+            raise HttpError(400, "Body needs a non-empty \"query\"")
+        if self.inFlight >= self.workers + self.maxQueue:
+            self.stats["rejected"] += 1
+            raise HttpError(503, "Server is at capacity, retry shortly")
+        session = self.get_session(payload.get("sessionId"), create=True)
+        self.inFlight += 1
+        self.stats["admitted"] += 1
+        startTime = time.perf_counter()
+        try:
+            async with session.lock:
+                try:
+                    await asyncio.wait_for(self.slots.acquire(), self.queueTimeout)
+                except asyncio.TimeoutError:
+                    self.stats["rejected"] += 1
+                    raise HttpError(503, "Timed out waiting for a worker")
+                try:
+                    loop = asyncio.get_running_loop()
+                    summary, tokensUsed = await loop.run_in_executor(self.executor, self.run_query, session, query)
+                except Exception:
+                    self.stats["failed"] += 1
+                    raise
+                finally:
+                    self.slots.release()
+                session.requests += 1
+                self.stats["completed"] += 1
+        finally:
+            self.inFlight -= 1
+            session.lastSeen = time.monotonic()
+        return {
+            "sessionId": session.sessionId,
+            "summary": summary,
+            "tokensUsed": tokensUsed,
+            "sessionTokens": session.chatHistory.usedTokens,
+            "latency": round(time.perf_counter() - startTime, 4)
+        }
+
+    def get_stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "inFlight": self.inFlight,
+            "workers": self.workers,
+            "maxQueue": self.maxQueue,
+            "requests": dict(self.stats),
+            "filterPaths": dict(newsV6.FILTER_STATS),
+            "filterCache": newsV6.FILTER_CACHE.get_stats(),
+            "articleCache": newsV6.ARTICLE_CACHE.get_stats(),
+            "summaryCache": newsV6.SUMMARY_CACHE.get_stats(),
+            "articleStore": newsV6.ARTICLE_STORE.get_stats(),
+            "providerCalls": newsV6.SINGLE_FLIGHT.get_stats(),
+            "quota": quota_usage()
+        }
+
+    async def route(self, method, path, payload):
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok", "inFlight": self.inFlight, "sessions": len(self.sessions)}
+        if parts == ["stats"] and method == "GET":
+            return 200, self.get_stats()
+        if parts == ["metrics"] and method == "GET":
+            return 200, render_metrics()
+        if parts == ["query"] and method == "POST":
+            return 200, await self.query(payload)
+        if parts == ["sessions"] and method == "POST":
+            return 201, self.get_session(create=True).usage()
+        if len(parts) == 2 and parts[0] == "sessions":
+            if method == "GET":
+                return 200, self.get_session(parts[1]).usage()
+            if method == "DELETE":
+                session = self.get_session(parts[1])
+                del self.sessions[session.sessionId]
+                return 200, session.usage()
+        if parts and parts[0] in ("health", "stats", "metrics", "query", "sessions"):
+            raise HttpError(405, f"{method} is not supported on {path}")
+        raise HttpError(404, f"No route for {path}")
+
+    async def read_request(self, reader):
+        requestLine = await reader.readline()
+        try:
+            method, target, _ = requestLine.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise HttpError(413, f"Body is larger than {MAX_BODY} bytes")
+        payload = {}
+        if length:
+            try:
+                payload = json.loads(await reader.readexactly(length))
+            except json.JSONDecodeError:
+                raise HttpError(400, "Body is not valid JSON")
+            if not isinstance(payload, dict):
+                raise HttpError(400, "Body must be a JSON object")
+        return method.upper(), urlsplit(target).path, payload
+
+    async def handle_connection(self, reader, writer):
+        try:
+            method, path, payload = await asyncio.wait_for(self.read_request(reader), READ_TIMEOUT)
+            status, body = await self.route(method, path, payload)
+        except HttpError as e:
+            status, body = e.status, {"error": str(e)}
+        except asyncio.TimeoutError:
+            status, body = 408, {"error": "Timed out reading the request"}
+        except Exception as e:
+            print(f"Request failed: {e}")
+            status, body = 500, {"error": str(e)}
+        #metrics are served as Prometheus text, everything else as JSON
+        if isinstance(body, str):
+            data, contentType = body.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            data, contentType = json.dumps(body).encode("utf-8"), "application/json"
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: {contentType}\r\nContent-Length: {len(data)}\r\nConnection: close\r\n"
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        try:
+            writer.write(head.encode("latin-1") + b"\r\n" + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def expire_loop(self):
+        while True:
+            await asyncio.sleep(60)
+            self.expire_sessions()
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        expireTask = asyncio.create_task(self.expire_loop())
+        print(f"News Summarizer server listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            expireTask.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    if os.getenv("PREFETCH_ENABLED", "0") == "1":
+        newsV6.PREFETCHER.start()
+    try:
+        asyncio.run(NewsServer().serve())
+    except KeyboardInterrupt:
+        print("Goodbye")
+
+if __name__ == "__main__":
+    main()
@@ -6,61 +6,85 @@ import io
 import json
 from datetime import datetime, timedelta
 from langchain_openai import ChatOpenAI
-import concurrent.futures
 import re
 from datetime import datetime
 from word2number import w2n
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain.schema import AIMessage, SystemMessage
 import speech_recognition as sr
-import time
-import tiktoken
+import asyncio
+import math
+from articleCache import ArticleCache, make_key
+from singleFlight import SingleFlight
+from fetchEngine import make_job, run_jobs_sync, iter_jobs, run_sync, PAGE_EXECUTOR, PAGE_PARALLELISM
+from filterParser import parse_filters
+from filterCache import FilterCache
+from summarizer import map_reduce, summarize_chunk, CHUNK_TOKENS, MAP_EXECUTOR
+from tokenCounter import count_tokens
+from chatHistory import ChatHistory
+from articleDedup import dedupe_articles, normalize_url
+from articles import ArticleCollection, normalize_articles, category_label
+from articleStore import ArticleStore, date_range
+from vectorIndex import VectorIndex
+from tracing import span, start_span, annotate, METRICS
+from ranking import rank_articles, TOKEN_BUDGET
+from resilience import resilient_get, ProviderError, CircuitOpenError
+from rateLimiter import QuotaExhaustedError, quota_usage, get_scheduler
+from newsApis import NEWS_APIS
+from prefetcher import HeadlinePrefetcher, PREFETCH_CATEGORIES, PREFETCH_COUNTRIES
+from summaryCache import SummaryCache, fingerprint, category_key, normalize_intent
 
 load_dotenv()
 
-TOTAL_TOKENS = 0
-
 model = ChatOpenAI(model="gpt-4o")
 
 CATEGORIES = ["business","entertainment","general","health","sports","science","technology"]
 
-def count_tokens(text, model="gpt-4"):
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
-
-NEWS_APIS = [
-    {
-        "name":"NewsApi",
-        "headLineUrl":"https://newsapi.org/v2/top-headlines",
-        "storiesUrl":"https://newsapi.org/v2/everything",
-        "categoryParam":"category",
-        "apiKeyParam":"apiKey",
-        "fromDateParam":"from",
-        "toDateParam":"to",
-        "languageParam":"language",
-        "countryParam":"country",
-        "apiKey":os.getenv("NEWSAPI_API_KEY")
-    },
-    {
-        "name":"GNews",
-        "headLineUrl":"https://gnews.io/api/v4/top-headlines",
-        "storiesUrl":"https://gnews.io/api/v4/search",
-        "categoryParam":"category",
-        "apiKeyParam":"apikey",
-        "fromDateParam":"from",
-        "toDateParam":"to",
-        "languageParam":"lang",
-        "countryParam":"country",
-        "apiKey":os.getenv("G_NEWS_KEY")
-    }    
-]
-
-def call_newsApi(news, category, date, language, country, userInput):
-    params = {news["apiKeyParam"]:news["apiKey"]}
+SYSTEM_PROMPT = "You are helpful assistant with news articles."
+
+ARTICLE_CACHE = ArticleCache()
+ARTICLE_STORE = ArticleStore()
+#semantic retrieval needs an embeddings model, so it stays off unless asked for
+VECTOR_INDEX = VectorIndex() if os.getenv("RETRIEVAL_ENABLED", "0") == "1" else None
+SINGLE_FLIGHT = SingleFlight()
+
+LOCAL_FILTER_CONFIDENCE = float(os.getenv("LOCAL_FILTER_CONFIDENCE", 0.75))
+FILTER_STATS = {"local": 0, "cache": 0, "llm": 0}
+FILTER_CACHE = FilterCache()
+
+#prompt tokens allowed for one gpt-4o call, leaving room for the answer
+CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET", 100000))
+
+#seconds the pipelined mode waits for providers and map summaries before merging what it has
+PIPELINE_DEADLINE = float(os.getenv("PIPELINE_DEADLINE", 8))
+#extra seconds allowed past the deadline for the first map summary, so a hung call cannot block forever
+PIPELINE_GRACE = float(os.getenv("PIPELINE_GRACE", 20))
+#PIPELINED=1 summarizes each provider's articles as they land instead of after every fetch finished
+PIPELINED = os.getenv("PIPELINED", "0") == "1"
+
+#articles read per provider call across all pages, and how many article tokens are worth fetching before ranking
+MAX_ARTICLES = int(os.getenv("MAX_ARTICLES", 100))
+FETCH_TOKEN_BUDGET = int(os.getenv("FETCH_TOKEN_BUDGET", TOKEN_BUDGET * 3))
+
+#share of each provider's daily quota the headline prefetcher leaves untouched for live requests
+PREFETCH_QUOTA_RESERVE = float(os.getenv("PREFETCH_QUOTA_RESERVE", 0.5))
+#share of each provider's daily quota follow-up pages leave untouched, page 1 is always read
+PAGE_QUOTA_RESERVE = float(os.getenv("PAGE_QUOTA_RESERVE", 0.25))
+
+SUMMARY_CACHE = SummaryCache()
+#question used to pre-generate each category's headline summary after a prefetch
+PREGENERATE_PROMPT = "What are today's top {} headlines?"
+
+def wants_headlines(userInput):
+    return "headlines" in userInput or "top stories" in userInput
+
+def call_newsApi(news, category, date, language, country, userInput, refresh=False):
+    #the api key is added per attempt by the rate limiter in resilient_get
+    params = {}
     #URL
     if date[0] == datetime.today().strftime("%Y-%m-%d"):
         if news["name"] == "NewsApi":
             url = news["headLineUrl"]
-        elif news["name"] == "GNews" and ("headlines" in userInput or "top stories" in userInput):
+        elif news["name"] == "GNews" and wants_headlines(userInput):
             url = news["headLineUrl"]
         else:
             url = news["storiesUrl"]
@@ -92,8 +116,75 @@ def call_newsApi(news, category, date, language, country, userInput):
         params[news["countryParam"]] = country
     print(url)
     print(params)
-    response = requests.get(url, params=params)
-    return response.json().get("articles", [])
+    #identical requests from concurrent users share one cache lookup and one HTTP call
+    return SINGLE_FLIGHT.do(make_key(news, url, params), fetch_articles, news, url, params, refresh)
+
+def fetch_articles(news, url, params, refresh=False):
+    """Returns (articles, exhaustive), exhaustive is True only when every article the provider has for params was read."""
+    #refresh skips the cached copy but still stores the new one
+    articles = None if refresh else ARTICLE_CACHE.get(news, url, params)
+    annotate(cacheHit=articles is not None)
+    if articles is not None:
+        #the cache does not know whether the entry was cut short, so it never counts as exhaustive
+        return articles, False
+    try:
+        if url == news["storiesUrl"]:
+            articles, complete, exhaustive = fetch_pages(news, url, params)
+        else:
+            #headlines are a short ranked list, one page of them is all a summary needs and costs one request of quota
+            articles, total = fetch_page(news, url, params, 1, min(news["maxPageSize"], MAX_ARTICLES))
+            complete, exhaustive = True, len(articles) >= total
+    except (requests.RequestException, ProviderError, CircuitOpenError, QuotaExhaustedError, ValueError) as e:
+        print(f"{news['name']} request failed: {e}")
+        return [], False
+    if complete:
+        ARTICLE_CACHE.put(news, url, params, articles)
+    return articles, exhaustive
+
+def fetch_page(news, url, params, page, pageSize):
+    pageParams = dict(params)
+    pageParams[news["pageParam"]] = page
+    pageParams[news["pageSizeParam"]] = pageSize
+    payload = resilient_get(news, url, pageParams).json()
+    return payload.get("articles", []), payload.get(news["totalKey"], 0)
+
+def estimate_tokens(articles):
+    return sum(count_tokens(f"{article.get('title') or ''} {article.get('content') or ''}") for article in articles)
+
+def fetch_pages(news, url, params, maxArticles=MAX_ARTICLES, tokenBudget=FETCH_TOKEN_BUDGET):
+    """Reads page 1, then the remaining pages in parallel waves until maxArticles, tokenBudget, the provider's
+    maxPages or its spare quota is reached.
+
+    Returns (articles, complete, exhaustive), complete is False when a later page failed and exhaustive
+    is False as well when any of those limits stopped the reading before the last page.
+    """
+    pageSize = min(news["maxPageSize"], maxArticles)
+    articles, total = fetch_page(news, url, params, 1, pageSize)
+    lastPage = min(math.ceil(min(total, maxArticles) / pageSize), math.ceil(maxArticles / pageSize))
+    if news.get("maxPages"):
+        lastPage = min(lastPage, news["maxPages"])
+    #a provider allowing one request per second would only queue a wider wave in its rate limiter
+    parallelism = max(1, min(PAGE_PARALLELISM, int(news["ratePerSecond"])))
+    tokens = estimate_tokens(articles)
+    nextPage = 2
+    while nextPage <= lastPage and tokens < tokenBudget and len(articles) == (nextPage - 1) * pageSize:
+        wave = range(nextPage, min(nextPage + parallelism, lastPage + 1))
+        if not has_spare_quota(news, PAGE_QUOTA_RESERVE, len(wave)):
+            print(f"{news['name']} is short of quota, keeping {len(articles)} articles")
+            break
+        futures = [PAGE_EXECUTOR.submit(fetch_page, news, url, params, page, pageSize) for page in wave]
+        for future in futures:
+            try:
+                pageArticles, pageTotal = future.result()
+            except (requests.RequestException, ProviderError, CircuitOpenError, QuotaExhaustedError, ValueError) as e:
+                print(f"{news['name']} page fetch failed, keeping {len(articles)} articles: {e}")
+                return articles[:maxArticles], False, False
+            articles += pageArticles
+            tokens += estimate_tokens(pageArticles)
+        nextPage = wave.stop
+    #a short page means the provider ran out of articles, otherwise every page up to total must have been read
+    exhaustive = len(articles) < (nextPage - 1) * pageSize or (nextPage > lastPage and total <= lastPage * pageSize)
+    return articles[:maxArticles], True, exhaustive
 
 def check_used_categories(currCategories, usedCategories):
     if currCategories == "None Found":
@@ -110,8 +201,20 @@ def check_used_categories(currCategories, usedCategories):
         else:
             return currCategories
 
-def get_filters(userInput) :
-    global TOTAL_TOKENS
+def get_filters(userInput, chatHistory=None) :
+    trace = start_span("filters")
+    filters, confidence = parse_filters(userInput)
+    trace.set(confidence=round(confidence, 2))
+    if confidence >= LOCAL_FILTER_CONFIDENCE:
+        FILTER_STATS["local"] += 1
+        trace.end(path="local")
+        return json.dumps(filters)
+    cached = FILTER_CACHE.lookup(userInput)
+    if cached is not None:
+        FILTER_STATS["cache"] += 1
+        trace.end(path="cache", cacheHit=True)
+        return cached
+    FILTER_STATS["llm"] += 1
     today = datetime.today()
 
     prompt = f"""
@@ -164,89 +267,315 @@ def get_filters(userInput) :
             }}
         Input: {userInput}
     """
-    startTime = time.time()
     client = openai.OpenAI()
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-    )
-    endTime = time.time()
-    elapsedTime = endTime - startTime
-    print(f"Get Filters Execution Time: {elapsedTime:.4f} seconds")
-    print("Tokens Used:")
-    print(response.usage.total_tokens)
-    TOTAL_TOKENS += response.usage.total_tokens
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt}],
+        )
+    except Exception as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        trace.end(path="llm", cacheHit=False)
+        raise
+    trace.end(path="llm", cacheHit=False, tokens=response.usage.total_tokens)
+    if chatHistory is not None:
+        chatHistory.add_usage(response.usage.total_tokens)
     print(response.choices[0].message.content)
+    FILTER_CACHE.store(userInput, response.choices[0].message.content)
     return response.choices[0].message.content
 
+def prepare_articles(articlesText, prompt, chatHistory):
+    chatHistory.compact()
+    budget = max(CONTEXT_BUDGET - chatHistory.promptTokens - count_tokens(prompt), 1000)
+    if count_tokens(articlesText) > budget:
+        with span("map_reduce", budget=budget) as trace:
+            articlesText, mapTokens = map_reduce(model, articlesText, prompt, budget)
+            chatHistory.add_usage(mapTokens)
+            trace.set(tokens=mapTokens)
+    chatHistory.append_query(prompt, articlesText)
+    return chatHistory.promptTokens
+
+def record_completion(chatHistory, trace, promptTokens, completion):
+    totalTokens = promptTokens + count_tokens(completion)
+    chatHistory.add_usage(totalTokens)
+    trace.set(tokens=totalTokens, promptTokens=promptTokens, bytes=len(completion.encode("utf-8")))
+
 def invoke_articles(articlesText, prompt, chatHistory):
-    global TOTAL_TOKENS
-    query = HumanMessage(content=prompt+'\n\n'+articlesText)
-    chatHistory.append(query)
-    promptTokens = sum(count_tokens(msg.content) for msg in chatHistory)
-    startTime = time.time()
-    result = model.invoke(chatHistory)
-    endTime = time.time()
-    elapsedTime = endTime - startTime
-    completionTokens = count_tokens(result.content)
-    totalTokens = promptTokens + completionTokens
-    TOTAL_TOKENS += totalTokens
-    print(f"Invoking articles Execution Time: {elapsedTime:.4f} seconds")
-    print("Tokens Used:")
-    print(totalTokens)
+    promptTokens = prepare_articles(articlesText, prompt, chatHistory)
+    with span("summarize", stream=False) as trace:
+        result = model.invoke(chatHistory.messages)
+        record_completion(chatHistory, trace, promptTokens, result.content)
     return result.content
 
-def make_request(news, category, date, language, country, userInput):
-    articlesList = call_newsApi(news, category, date, language, country, userInput)
-    if news["name"] == "NewsApi":
-        return '\n\n'.join([f'''Author: {article['author']}\nTitle: {article['title']}\nPublished At: {article['publishedAt']}\nContent: {article['content']}\nCategory: {category}\nApiSource: {news['name']}\n''' for article in articlesList])
-    elif news["name"] == "GNews":
-       return '\n\n'.join([f'''Author: {article['source']['name']}\nTitle: {article['title']}\nPublished At: {article['publishedAt']}\nContent: {article['content']}\nCategory: {category}\nApiSource: {news['name']}\n''' for article in articlesList])
+def stream_articles(articlesText, prompt, chatHistory):
+    promptTokens = prepare_articles(articlesText, prompt, chatHistory)
+    with span("summarize", stream=True) as trace:
+        parts = []
+        for chunk in model.stream(chatHistory.messages):
+            if not parts:
+                trace.set(firstTokenMs=round(trace.seconds() * 1000, 3))
+            parts.append(chunk.content)
+            yield chunk.content
+        record_completion(chatHistory, trace, promptTokens, ''.join(parts))
+
+async def astream_articles(articlesText, prompt, chatHistory):
+    #compaction and map-reduce block, so keep them off the event loop
+    promptTokens = await asyncio.to_thread(prepare_articles, articlesText, prompt, chatHistory)
+    with span("summarize", stream=True) as trace:
+        parts = []
+        async for chunk in model.astream(chatHistory.messages):
+            if not parts:
+                trace.set(firstTokenMs=round(trace.seconds() * 1000, 3))
+            parts.append(chunk.content)
+            yield chunk.content
+        record_completion(chatHistory, trace, promptTokens, ''.join(parts))
+
+def make_request(news, category, date, language, country, userInput, refresh=False):
+    with span("fetch", provider=news["name"], category=category_label(category), refresh=refresh) as trace:
+        articles = fetch_category(news, category, date, language, country, userInput, refresh)
+        trace.set(articles=len(articles))
+    return articles
+
+def fetch_category(news, category, date, language, country, userInput, refresh=False):
+    label = category_label(category)
+    days = date_range(date)
+    today = datetime.today().strftime("%Y-%m-%d")
+    if refresh or not days or days[0] >= today:
+        articles, _ = call_newsApi(news, category, date, language, country, userInput, refresh)
+        articles = normalize_articles(news, articles, category)
+        ARTICLE_STORE.ingest(articles, news["name"], label, country, language)
+        return articles
+    #past days never change, so only today and the days this provider was never asked about are fetched
+    missing = ARTICLE_STORE.missing_days(news["name"], label, country, language, days)
+    annotate(storeDays=len(days) - len(missing), fetchedDays=len(missing))
+    pastMissing = [day for day in missing if day < today]
+    if pastMissing:
+        #a closed range, so neither the article cache nor the coverage ever mixes in today's changing news
+        articles, exhaustive = call_newsApi(news, category, [pastMissing[0], pastMissing[-1]], language, country, userInput)
+        articles = normalize_articles(news, articles, category)
+        ARTICLE_STORE.ingest(articles, news["name"], label, country, language)
+        #only days seen in a fully read answer are final, a capped or failed read is asked again next time
+        if exhaustive:
+            seenDays = {article.publishedAt[:10] for article in articles if article.publishedAt}
+            ARTICLE_STORE.mark_covered(news["name"], label, country, language, [day for day in pastMissing if day in seenDays])
+    if today in missing:
+        articles, _ = call_newsApi(news, category, [today], language, country, userInput)
+        ARTICLE_STORE.ingest(normalize_articles(news, articles, category), news["name"], label, country, language)
+    keywords = list(category.items())[0][1] if isinstance(category, dict) else None
+    return ARTICLE_STORE.query(news["name"], label, country, language, days[0], days[-1], keywords)
+
+def dedupe_stage(articles):
+    with span("dedup", input=len(articles)) as trace:
+        kept, removed = dedupe_articles(list(articles))
+        trace.set(articles=len(kept), removed=len(removed), removedTokens=count_tokens(ArticleCollection(removed).render()))
+    return ArticleCollection(kept)
+
+def retrieve_stage(articles, userInput):
+    if VECTOR_INDEX is None:
+        return articles
+    with span("retrieve", input=len(articles)) as trace:
+        selected = VECTOR_INDEX.retrieve(userInput, list(articles))
+        trace.set(articles=len(selected))
+    return ArticleCollection(selected)
+
+def rank_stage(articles, filters, userInput):
+    with span("rank", input=len(articles)) as trace:
+        selected, tokensUsed = rank_articles(articles, filters, userInput)
+        trace.set(articles=len(selected), articleTokens=tokensUsed)
+    return ArticleCollection(selected)
+
+def make_jobs(newsApis, response, userInput):
+    return [make_job(news["headLineUrl"], make_request, news, category, response["date"], response["language"], response["country"], userInput)
+            for news in newsApis for category in response["categories"]]
 
 def fetch_news(news, response, userInput):
-    combinedArticles = ""
+    articles = ArticleCollection()
     if isinstance(response, dict):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(make_request, news, category, response["date"], response["language"], response["country"], userInput) for category in response["categories"]]
-            for future in concurrent.futures.as_completed(futures):
-                combinedArticles += future.result() + '\n\n'
-    return combinedArticles
-
-def process_request(userInput, chatHistory, usedCategories):
-    combinedArticles = ""
-    response = get_filters(userInput)
-    response = json.loads(response)
-    #categories = check_used_categories(response["category"], usedCategories)
-    if len(response) > 0:
-        startTime = time.time()
+        for job, articlesList in run_jobs_sync(make_jobs([news], response, userInput)):
+            articles.extend(articlesList)
+    return dedupe_stage(articles).render()
+
+def warm_cache(filters, userInput=""):
+    run_jobs_sync(make_jobs(NEWS_APIS, filters, userInput))
+    return ARTICLE_CACHE.get_stats()
+
+def has_spare_quota(news, reserve=PREFETCH_QUOTA_RESERVE, calls=1):
+    """True when calls more requests still leave reserve of the provider's daily quota untouched."""
+    usage = get_scheduler(news).usage()
+    if usage["dailyQuota"] is None:
+        return True
+    return usage["remaining"] - calls >= usage["dailyQuota"] * reserve
+
+def prefetch_headlines(category, country):
+    filters = {"categories": [category], "date": [datetime.today().strftime("%Y-%m-%d")], "language": "", "country": country}
+    newsApis = [news for news in NEWS_APIS if has_spare_quota(news)]
+    articles = ArticleCollection()
+    for job, articlesList in run_jobs_sync([make_job(news["headLineUrl"], make_request, news, category, filters["date"], "", country, "headlines", True) for news in newsApis]):
+        articles.extend(articlesList)
+    articles = list(dedupe_stage(articles))
+    if VECTOR_INDEX is not None:
+        #embedding here keeps retrieval at request time down to the question itself
+        VECTOR_INDEX.add_articles(articles)
+    return articles
+
+def summary_key(articles, response, userInput):
+    return fingerprint(articles), category_key(response.get("categories", [])), normalize_intent(userInput)
+
+def cache_summary(parts, key):
+    #passes a streamed answer through and stores it once it is complete
+    collected = []
+    for part in parts:
+        collected.append(part)
+        yield part
+    SUMMARY_CACHE.put(*key, ''.join(collected))
+
+def pregenerate_summaries():
+    today = datetime.today().strftime("%Y-%m-%d")
+    for category in PREFETCHER.categories:
+        for country in PREFETCHER.countries:
+            response = {"categories": [category], "date": [today], "language": "", "country": country}
+            snapshot = snapshot_articles(response)
+            if snapshot is None:
+                continue
+            prompt = PREGENERATE_PROMPT.format(category)
+            ranked = rank_stage(dedupe_stage(snapshot[0]), response, prompt)
+            key = summary_key(ranked, response, prompt)
+            if SUMMARY_CACHE.contains(*key):
+                continue
+            summary = invoke_articles(ranked.render(), prompt, ChatHistory([SystemMessage(content=SYSTEM_PROMPT)]))
+            SUMMARY_CACHE.put(*key, summary)
+
+PREFETCHER = HeadlinePrefetcher(prefetch_headlines, PREFETCH_CATEGORIES or CATEGORIES, PREFETCH_COUNTRIES,
+                                onRefresh=pregenerate_summaries if os.getenv("SUMMARY_PREGENERATE", "0") == "1" else None)
+
+def snapshot_articles(response):
+    """Articles for today's plain category headlines from the prefetcher, as (articles, ageSeconds), or None."""
+    if response.get("date") != [datetime.today().strftime("%Y-%m-%d")] or response.get("language"):
+        return None
+    categories = response.get("categories") or []
+    if not categories or not all(isinstance(category, str) for category in categories):
+        return None
+    articles = ArticleCollection()
+    oldest = 0.0
+    for category in categories:
+        snapshot = PREFETCHER.get_snapshot(category, response.get("country", ""))
+        if snapshot is None:
+            return None
+        articles.extend(snapshot[0])
+        oldest = max(oldest, snapshot[1])
+    return articles, oldest
+
+def fetch_stage(response, userInput):
+    """Deduplicated articles for a set of filters, from the headline snapshot when it has them."""
+    articles = ArticleCollection()
+    snapshot = snapshot_articles(response) if len(response) > 0 else None
+    if snapshot is not None:
+        articles, age = snapshot
+        print(f"Serving headlines from the prefetched snapshot ({age / 60:.1f} minutes old)")
+    elif len(response) > 0:
         print("Searching the web...")
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(fetch_news, news, response, userInput) for news in NEWS_APIS]
-            for future in concurrent.futures.as_completed(futures):
-                combinedArticles += future.result() + '\n\n'
-        endTime = time.time()
-        elapsedTime = endTime - startTime
-        print(f"Performing API calls Execution Time: {elapsedTime:.4f} seconds")
-        '''
-        if isinstance(categories, list):
-            usedCategories += categories
-        else:
-            usedCategories.append(categories)
-        '''
+        with span("fetch_all") as trace:
+            #every provider x category call shares one event loop and the pooled connections
+            for job, articlesList in run_jobs_sync(make_jobs(NEWS_APIS, response, userInput)):
+                articles.extend(articlesList)
+            trace.set(articles=len(articles))
+    return dedupe_stage(articles)
+
+def summarize_stage(articles, response, userInput, chatHistory, stream=False):
+    rankedArticles = rank_stage(retrieve_stage(articles, userInput), response, userInput)
+    combinedArticles = rankedArticles.render()
+    #a cached answer only holds when no earlier turn can change it
+    key = summary_key(rankedArticles, response, userInput) if len(rankedArticles) and not chatHistory.turn_starts() else None
+    summary = SUMMARY_CACHE.get(*key) if key is not None else None
+    annotate(summaryCacheHit=summary is not None)
+    if summary is not None:
+        print("Serving summary from the summary cache")
+        chatHistory.append_query(userInput, combinedArticles)
+        return iter([summary]) if stream else summary
+    if stream:
+        parts = stream_articles(combinedArticles, userInput, chatHistory)
+        return cache_summary(parts, key) if key is not None else parts
     summary = invoke_articles(combinedArticles, userInput, chatHistory)
+    if key is not None:
+        SUMMARY_CACHE.put(*key, summary)
     return summary
 
+def process_request(userInput, chatHistory, usedCategories, stream=False):
+    response = get_filters(userInput, chatHistory)
+    response = json.loads(response)
+    #categories = check_used_categories(response["category"], usedCategories)
+    articles = fetch_stage(response, userInput)
+    '''
+    if isinstance(categories, list):
+        usedCategories += categories
+    else:
+        usedCategories.append(categories)
+    '''
+    return summarize_stage(articles, response, userInput, chatHistory, stream)
+
+async def pipelined_notes(response, userInput, chatHistory, deadline=PIPELINE_DEADLINE):
+    loop = asyncio.get_running_loop()
+    endTime = loop.time() + deadline
+    seenUrls = set()
+    mapTasks = []
+    async for job, articlesList in iter_jobs(make_jobs(NEWS_APIS, response, userInput), deadline):
+        #same story under another category or provider was already sent to a map call
+        #articles without a url cannot be matched by it, they are left to dedupe_articles
+        fresh = [article for article in articlesList if not article.url or normalize_url(article.url) not in seenUrls]
+        seenUrls.update(normalize_url(article.url) for article in fresh if article.url)
+        if not fresh:
+            continue
+        selected, tokensUsed = rank_articles(dedupe_articles(fresh)[0], response, userInput, CHUNK_TOKENS)
+        print(f"Summarizing {len(selected)} articles from {job[0]} ({tokensUsed} tokens)")
+        mapTasks.append(loop.run_in_executor(MAP_EXECUTOR, summarize_chunk, model, userInput, ArticleCollection(selected).render()))
+    notes = []
+    pending = set(mapTasks)
+    while pending:
+        remaining = endTime - loop.time()
+        #past the deadline only wait if nothing at all has been summarized yet, and then only for the grace period
+        if (remaining <= 0 and notes) or remaining <= -PIPELINE_GRACE:
+            break
+        timeout = remaining if remaining > 0 else remaining + PIPELINE_GRACE
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                print(f"Map summary failed: {task.exception()}")
+                continue
+            summary, tokensUsed = task.result()
+            chatHistory.add_usage(tokensUsed)
+            notes.append(summary)
+    if pending:
+        print(f"{len(pending)} map summaries missed the {deadline}s deadline")
+    return '\n\n'.join(notes)
+
+def process_request_pipelined(userInput, chatHistory, usedCategories, stream=False, deadline=PIPELINE_DEADLINE):
+    response = json.loads(get_filters(userInput, chatHistory))
+    return pipelined_stage(response, userInput, chatHistory, stream, deadline)
+
+def pipelined_stage(response, userInput, chatHistory, stream=False, deadline=PIPELINE_DEADLINE):
+    print("Searching the web and summarizing as results land...")
+    with span("pipelined_map", deadline=deadline) as trace:
+        notes = run_sync(pipelined_notes(response, userInput, chatHistory, deadline))
+        trace.set(bytes=len(notes.encode("utf-8")))
+    if stream:
+        return stream_articles(notes, userInput, chatHistory)
+    return invoke_articles(notes, userInput, chatHistory)
+
+def get_handler(pipelined=PIPELINED):
+    return process_request_pipelined if pipelined else process_request
+
 def main():
-    global TOTAL_TOKENS
     recognizer = sr.Recognizer()
     recognizer.dynamic_energy_threshold = True
     recognizer.energy_threshold = 250
     recognizer.pause_threshold = 2
     recognizer.dynamic_energy_adjustment_damping = 0.1
-    chatHistory = []
+    chatHistory = ChatHistory()
     usedCategories = []
-    systemMessage = SystemMessage(content="You are helpful assistant with news articles.")
+    systemMessage = SystemMessage(content=SYSTEM_PROMPT)
     chatHistory.append(systemMessage)
+    if os.getenv("PREFETCH_ENABLED", "0") == "1":
+        PREFETCHER.start()
     print("This is the News Summarizer")
     while True:
         input("Press enter when you are ready.")
@@ -270,15 +599,39 @@ def main():
         if userInput.lower() == "quit.":
            print("Goodbye")
            break
-        startTime = time.time()
-        summary = process_request(userInput, chatHistory, usedCategories)
-        print("AI Response: "+ summary)
-        endTime = time.time()
-        elapsedTime = endTime - startTime
+        parts = []
+        with span("request", stream=True) as trace:
+            for part in get_handler()(userInput, chatHistory, usedCategories, stream=True):
+                if not parts:
+                    trace.set(firstTokenMs=round(trace.seconds() * 1000, 3))
+                    print("AI Response: ", end="")
+                print(part, end="", flush=True)
+                parts.append(part)
+            print()
+            trace.set(tokens=chatHistory.usedTokens)
+        summary = ''.join(parts)
         print("**********************************")
-        print(f"Complete run Execution Time: {elapsedTime:.4f} seconds")
+        print("Stage latencies in seconds (histogram p50/p95):")
+        print(METRICS.summary())
         print("Total Tokens used:")
-        print(TOTAL_TOKENS)
+        print(chatHistory.usedTokens)
+        print("Filter paths (local/cache/llm):")
+        print(FILTER_STATS)
+        print("Filter Cache:")
+        print(FILTER_CACHE.get_stats())
+        print("Provider quota usage:")
+        print(quota_usage())
+        print("Provider call coalescing:")
+        print(SINGLE_FLIGHT.get_stats())
+        print("Article Cache:")
+        print(ARTICLE_CACHE.get_stats())
+        print("Summary Cache:")
+        print(SUMMARY_CACHE.get_stats())
+        print("Article Store:")
+        print(ARTICLE_STORE.get_stats())
+        if VECTOR_INDEX is not None:
+            print("Embeddings (cached/embedded):")
+            print(VECTOR_INDEX.get_stats())
         print("**********************************")
 
         chatHistory.append(AIMessage(content=summary))
@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+from tracing import span
+
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", 1800))
+PREFETCH_CATEGORIES = [category for category in os.getenv("PREFETCH_CATEGORIES", "").split(",") if category]
+#an empty entry means "no country filter"
+#"" is what queries naming no country parse to, which is most of them, so it is the default snapshot
+PREFETCH_COUNTRIES = [country.strip() for country in os.getenv("PREFETCH_COUNTRIES", "").split(",")]
+PREFETCH_MAX_AGE = float(os.getenv("PREFETCH_MAX_AGE", PREFETCH_INTERVAL * 2))
+
+class HeadlinePrefetcher:
+    """Background thread that keeps a headline snapshot per (category, country) warm.
+
+    fetchFunc(category, country) does the actual fetching so quota handling stays with the caller,
+    onRefresh() runs after every full pass over the matrix.
+    """
+
+    def __init__(self, fetchFunc, categories, countries=PREFETCH_COUNTRIES, interval=PREFETCH_INTERVAL, maxAge=PREFETCH_MAX_AGE, onRefresh=None):
+        self.fetchFunc = fetchFunc
+        self.onRefresh = onRefresh
+        self.categories = categories
+        self.countries = countries
+        self.interval = interval
+        self.maxAge = maxAge
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def refresh_once(self):
+        for category in self.categories:
+            for country in self.countries:
+                if self.stopEvent.is_set():
+                    return
+                try:
+                    articles = self.fetchFunc(category, country)
+                except Exception as e:
+                    print(f"Prefetch of {category}/{country or 'any'} failed: {e}")
+                    continue
+                if not articles:
+                    continue
+                with self.lock:
+                    self.snapshots[(category, country)] = {"articles": articles, "fetchedAt": time.time()}
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            with span("prefetch", categories=len(self.categories), countries=len(self.countries)):
+                self.refresh_once()
+            if self.onRefresh is not None and not self.stopEvent.is_set():
+                try:
+                    self.onRefresh()
+                except Exception as e:
+                    print(f"Post-prefetch job failed: {e}")
+            self.stopEvent.wait(self.interval)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopEvent.clear()
+            self.thread = threading.Thread(target=self.run, name="headline-prefetch", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+
+    def get_snapshot(self, category, country):
+        """Returns (articles, ageSeconds) for a fresh enough snapshot, otherwise None."""
+        with self.lock:
+            snapshot = self.snapshots.get((category, country))
+        if snapshot is None:
+            return None
+        age = time.time() - snapshot["fetchedAt"]
+        if age > self.maxAge:
+            return None
+        return snapshot["articles"], age
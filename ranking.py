@@ -0,0 +1,112 @@
+import os
+import re
+import math
+import heapq
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from filterCache import STOP_WORDS
+from tokenCounter import count_tokens
+
+TOKEN_BUDGET = int(os.getenv("RANKING_TOKEN_BUDGET", 12000))
+RELEVANCE_WEIGHT = float(os.getenv("RANKING_RELEVANCE_WEIGHT", 0.7))
+RECENCY_WEIGHT = float(os.getenv("RANKING_RECENCY_WEIGHT", 0.3))
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("RANKING_HALF_LIFE_DAYS", 2))
+#each article already picked from the same source multiplies the next one's score by this
+DIVERSITY_DECAY = float(os.getenv("RANKING_DIVERSITY_DECAY", 0.7))
+K1 = 1.5
+B = 0.75
+
+def tokenize(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+def query_terms(filters, userInput):
+    terms = []
+    for category in filters.get("categories", []):
+        if isinstance(category, dict):
+            for name, keywords in category.items():
+                terms.append(name)
+                terms += tokenize(keywords)
+        else:
+            terms.append(category)
+    terms += [word for word in tokenize(userInput) if word not in STOP_WORDS]
+    return list(dict.fromkeys(terms))
+
+def bm25_scores(documents, terms):
+    lengths = [len(document) for document in documents]
+    averageLength = sum(lengths) / len(lengths) if lengths else 0
+    frequencies = [Counter(document) for document in documents]
+    scores = [0.0] * len(documents)
+    for term in terms:
+        containing = sum(1 for frequency in frequencies if term in frequency)
+        if not containing:
+            continue
+        idf = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+        for i, frequency in enumerate(frequencies):
+            count = frequency.get(term, 0)
+            if count:
+                scores[i] += idf * count * (K1 + 1) / (count + K1 * (1 - B + B * lengths[i] / (averageLength or 1)))
+    return scores
+
+def parse_published(publishedAt):
+    try:
+        published = datetime.fromisoformat((publishedAt or "").replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return published if published.tzinfo else published.replace(tzinfo=timezone.utc)
+
+def recency_scores(articles):
+    published = [parse_published(article.publishedAt) for article in articles]
+    known = [date for date in published if date is not None]
+    if not known:
+        return [0.0] * len(articles)
+    newest = max(known)
+    return [0.0 if date is None else 0.5 ** ((newest - date).total_seconds() / 86400 / RECENCY_HALF_LIFE_DAYS) for date in published]
+
+def source_of(article):
+    host = urlsplit(article.url or "").netloc.lower().removeprefix("www.")
+    return host or article.author or ""
+
+def rank_articles(articles, filters, userInput, tokenBudget=TOKEN_BUDGET):
+    """Greedily picks the best scoring articles that fit tokenBudget. Returns (selected, tokensUsed)."""
+    articles = list(articles)
+    if not articles:
+        return [], 0
+    relevance = bm25_scores([tokenize(f"{article.title} {article.title} {article.content}") for article in articles], query_terms(filters, userInput))
+    topRelevance = max(relevance) or 1.0
+    recency = recency_scores(articles)
+    scores = [RELEVANCE_WEIGHT * relevance[i] / topRelevance + RECENCY_WEIGHT * recency[i] for i in range(len(articles))]
+    tokens = [count_tokens(article.render()) for article in articles]
+    #one heap per source, only a source's best article can be the next pick since the decay is the same for all of them
+    bySource = {}
+    for i, article in enumerate(articles):
+        bySource.setdefault(source_of(article), []).append((-scores[i], i))
+    heads = []
+    for source, heap in bySource.items():
+        heapq.heapify(heap)
+        heads.append((heap[0][0], heap[0][1], source))
+    heapq.heapify(heads)
+    #smallest articles first, to stop once nothing left can fit the budget
+    bySize = sorted(range(len(articles)), key=lambda i: tokens[i])
+    smallest = 0
+    removed = set()
+    sourceCounts = Counter()
+    selected = []
+    tokensUsed = 0
+    while heads:
+        while bySize[smallest] in removed:
+            smallest += 1
+        if tokens[bySize[smallest]] > tokenBudget - tokensUsed:
+            break
+        _, best, source = heapq.heappop(heads)
+        heap = bySource[source]
+        heapq.heappop(heap)
+        removed.add(best)
+        if tokensUsed + tokens[best] <= tokenBudget:
+            selected.append(articles[best])
+            tokensUsed += tokens[best]
+            sourceCounts[source] += 1
+        if heap:
+            head = heap[0][1]
+            heapq.heappush(heads, (-scores[head] * DIVERSITY_DECAY ** sourceCounts[source], head, source))
+    return selected, tokensUsed
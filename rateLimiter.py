@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+from datetime import date
+
+QUOTA_ALERT_RATIO = float(os.getenv("QUOTA_ALERT_RATIO", 0.1))
+
+class QuotaExhaustedError(Exception):
+    pass
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updatedAt = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updatedAt) * self.rate)
+        self.updatedAt = now
+
+    def wait_time(self):
+        self.refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class KeyQuota:
+    def __init__(self, apiKey, ratePerSecond, dailyQuota):
+        self.apiKey = apiKey
+        self.bucket = TokenBucket(ratePerSecond)
+        self.dailyQuota = dailyQuota
+        self.day = date.today()
+        self.usedToday = 0
+        self.blockedUntil = 0.0
+
+    def remaining(self):
+        if self.day != date.today():
+            self.day = date.today()
+            self.usedToday = 0
+        if self.dailyQuota is None:
+            return float("inf")
+        return self.dailyQuota - self.usedToday
+
+    def wait_time(self):
+        return max(self.bucket.wait_time(), self.blockedUntil - time.monotonic())
+
+class ProviderScheduler:
+    """Token buckets and daily quotas for every api key of one provider, shared by all threads.
+
+    acquire() queues callers until a key has a token instead of letting the request fail.
+    """
+
+    def __init__(self, name, apiKeys, ratePerSecond, dailyQuota):
+        self.name = name
+        self.keys = [KeyQuota(apiKey, ratePerSecond, dailyQuota) for apiKey in apiKeys]
+        self.lock = threading.Lock()
+        self.alerted = False
+
+    def acquire(self, deadline=None):
+        """Returns an api key to use now, waiting up to the monotonic deadline for one to free up."""
+        while True:
+            with self.lock:
+                usable = [key for key in self.keys if key.remaining() > 0]
+                if not usable:
+                    raise QuotaExhaustedError(f"{self.name} daily quota exhausted on every key")
+                #rotate towards the key with the most quota left among those ready right now
+                key = min(usable, key=lambda key: (key.wait_time(), -key.remaining()))
+                wait = key.wait_time()
+                if wait <= 0:
+                    key.bucket.tokens -= 1
+                    key.usedToday += 1
+                    self.check_alert()
+                    return key.apiKey
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise QuotaExhaustedError(f"{self.name} rate limit would delay the request past its deadline")
+            time.sleep(wait)
+
+    def penalize(self, apiKey, seconds):
+        """Called when the provider itself answers 429 for a key."""
+        with self.lock:
+            for key in self.keys:
+                if key.apiKey == apiKey:
+                    key.blockedUntil = max(key.blockedUntil, time.monotonic() + seconds)
+
+    def check_alert(self):
+        total = sum(key.dailyQuota for key in self.keys if key.dailyQuota is not None)
+        if not total or self.alerted:
+            return
+        remaining = sum(key.remaining() for key in self.keys)
+        if remaining / total <= QUOTA_ALERT_RATIO:
+            self.alerted = True
+            print(f"WARNING: {self.name} has {remaining} of {total} daily requests left")
+
+    def usage(self):
+        with self.lock:
+            return {
+                "keys": len(self.keys),
+                "usedToday": sum(key.usedToday for key in self.keys),
+                "dailyQuota": sum(key.dailyQuota for key in self.keys) if all(key.dailyQuota is not None for key in self.keys) else None,
+                "remaining": sum(key.remaining() for key in self.keys)
+            }
+
+SCHEDULERS = {}
+SCHEDULERS_LOCK = threading.Lock()
+
+def get_scheduler(news):
+    with SCHEDULERS_LOCK:
+        if news["name"] not in SCHEDULERS:
+            apiKeys = news.get("apiKeys") or [news["apiKey"]]
+            SCHEDULERS[news["name"]] = ProviderScheduler(news["name"], apiKeys, news.get("ratePerSecond", 1), news.get("dailyQuota"))
+        return SCHEDULERS[news["name"]]
+
+def quota_usage():
+    with SCHEDULERS_LOCK:
+        schedulers = dict(SCHEDULERS)
+    return {name: scheduler.usage() for name, scheduler in schedulers.items()}
@@ -0,0 +1,134 @@
+import os
+import time
+import random
+import threading
+import requests
+from fetchEngine import http_get, DEFAULT_DEADLINE
+from rateLimiter import get_scheduler
+
+CONNECT_TIMEOUT = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("PROVIDER_READ_TIMEOUT", 10))
+RETRIES = int(os.getenv("PROVIDER_RETRIES", 2))
+BACKOFF = float(os.getenv("PROVIDER_BACKOFF", 0.5))
+MAX_BACKOFF = float(os.getenv("PROVIDER_MAX_BACKOFF", 8))
+FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+COOL_DOWN = float(os.getenv("BREAKER_COOL_DOWN", 30))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class ProviderError(Exception):
+    def __init__(self, provider, status, message=""):
+        super().__init__(f"{provider} answered {status} {message}".strip())
+        self.status = status
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    """Stops calling a provider for coolDown seconds after failureThreshold failures in a row."""
+
+    def __init__(self, failureThreshold=FAILURE_THRESHOLD, coolDown=COOL_DOWN):
+        self.failureThreshold = failureThreshold
+        self.coolDown = coolDown
+        self.failures = 0
+        self.openedAt = None
+        self.trialRunning = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.openedAt is None:
+                return True
+            if time.monotonic() - self.openedAt < self.coolDown or self.trialRunning:
+                return False
+            #half open: let a single trial call through
+            self.trialRunning = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.openedAt = None
+            self.trialRunning = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trialRunning = False
+            if self.failures >= self.failureThreshold or self.openedAt is not None:
+                self.openedAt = time.monotonic()
+
+    def release_trial(self):
+        """Frees the half open trial slot of a call that ended without a success or failure verdict."""
+        with self.lock:
+            self.trialRunning = False
+
+    def state(self):
+        with self.lock:
+            if self.openedAt is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.openedAt >= self.coolDown else "open"
+
+BREAKERS = {}
+BREAKERS_LOCK = threading.Lock()
+
+def get_breaker(news):
+    with BREAKERS_LOCK:
+        if news["name"] not in BREAKERS:
+            BREAKERS[news["name"]] = CircuitBreaker(news.get("failureThreshold", FAILURE_THRESHOLD), news.get("coolDown", COOL_DOWN))
+        return BREAKERS[news["name"]]
+
+def retry_delay(attempt, response=None):
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return min(float(response.headers["Retry-After"]), MAX_BACKOFF)
+    #full jitter so providers recovering from an outage are not hit in lockstep
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt))
+
+def resilient_get(news, url, params):
+    """GET with per-provider timeouts, jittered retries, a circuit breaker and an overall deadline.
+
+    The api key is picked per attempt by the provider's rate limiter, so params must not carry it.
+    """
+    breaker = get_breaker(news)
+    scheduler = get_scheduler(news)
+    connectTimeout = news.get("connectTimeout", CONNECT_TIMEOUT)
+    readTimeout = news.get("readTimeout", READ_TIMEOUT)
+    retries = news.get("retries", RETRIES)
+    deadline = time.monotonic() + news.get("deadline", DEFAULT_DEADLINE)
+    attempt = 0
+    while True:
+        response = None
+        if breaker.state() == "open":
+            raise CircuitOpenError(f"{news['name']} circuit is open")
+        #the key is taken before the trial slot, so a quota error can never hold the slot
+        apiKey = scheduler.acquire(deadline)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{news['name']} circuit is open")
+        requestParams = dict(params)
+        requestParams[news["apiKeyParam"]] = apiKey
+        try:
+            remaining = max(deadline - time.monotonic(), 0.1)
+            response = http_get(url, params=requestParams, timeout=(min(connectTimeout, remaining), min(readTimeout, remaining)))
+            if response.status_code < 400:
+                breaker.record_success()
+                return response
+            if response.status_code not in RETRY_STATUSES:
+                #the provider is healthy, the request itself is wrong (bad key, bad params)
+                breaker.record_success()
+                raise ProviderError(news["name"], response.status_code, response.text[:200])
+            error = ProviderError(news["name"], response.status_code)
+            breaker.record_failure()
+        except requests.RequestException as e:
+            error = e
+            breaker.record_failure()
+        finally:
+            #whatever escapes the attempt, the half open trial must not stay taken
+            breaker.release_trial()
+        delay = retry_delay(attempt, response)
+        if response is not None and response.status_code == 429:
+            scheduler.penalize(apiKey, max(delay, 1.0))
+        if attempt >= retries or time.monotonic() + delay >= deadline or breaker.state() == "open":
+            raise error
+        print(f"{news['name']} attempt {attempt + 1} failed ({error}), retrying in {delay:.2f} seconds")
+        time.sleep(delay)
+        attempt += 1
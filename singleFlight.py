@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import concurrent.futures
+
+class SingleFlight:
+    """Concurrent callers with the same key share one in-flight call and all get its result."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "shared": 0}
+
+    def join(self, key):
+        with self.lock:
+            self.stats["calls"] += 1
+            call = self.calls.get(key)
+            if call is not None:
+                self.stats["shared"] += 1
+                return call, False
+            call = self.calls[key] = concurrent.futures.Future()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        with self.lock:
+            del self.calls[key]
+        if error is not None:
+            call.set_exception(error)
+        else:
+            call.set_result(result)
+
+    def do(self, key, func, *args):
+        call, leader = self.join(key)
+        if not leader:
+            return call.result()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    async def ado(self, key, coroutineFunction, *args):
+        call, leader = self.join(key)
+        if not leader:
+            return await asyncio.wrap_future(call)
+        try:
+            result = await coroutineFunction(*args)
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
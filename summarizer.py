@@ -0,0 +1,72 @@
+import os
+import re
+import concurrent.futures
+from langchain.schema import HumanMessage, SystemMessage
+from tokenCounter import count_tokens, truncate_tokens
+
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 12000))
+MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", 8))
+PARALLELISM = int(os.getenv("SUMMARY_PARALLELISM", 4))
+MAP_OUTPUT_TOKENS = int(os.getenv("SUMMARY_MAP_OUTPUT_TOKENS", 800))
+MAX_COLLAPSES = 3
+
+#shared by callers that submit map calls one batch at a time, e.g. the pipelined mode
+MAP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=PARALLELISM, thread_name_prefix="summary")
+
+MAP_PROMPT = """You are condensing news articles for a later summary.
+Keep every fact, name, number, date, source and category that is relevant to this request: {request}
+Drop anything irrelevant. Answer with short bullet points only."""
+
+def split_articles(articlesText):
+    return [block.strip() for block in re.split(r'\n\s*\n(?=Author: )', articlesText) if block.strip()]
+
+def chunk_articles(articles, maxTokens=CHUNK_TOKENS, maxChunks=MAX_CHUNKS):
+    """Packs whole articles into chunks of at most maxTokens, dropping whatever does not fit in maxChunks."""
+    chunks = []
+    chunk = []
+    tokenCount = 0
+    dropped = 0
+    for article in articles:
+        articleTokens = count_tokens(article)
+        if articleTokens > maxTokens:
+            article = truncate_tokens(article, maxTokens)
+            articleTokens = maxTokens
+        if chunk and tokenCount + articleTokens > maxTokens:
+            chunks.append('\n\n'.join(chunk))
+            chunk = []
+            tokenCount = 0
+        if len(chunks) == maxChunks:
+            dropped += 1
+            continue
+        chunk.append(article)
+        tokenCount += articleTokens
+    if chunk and len(chunks) < maxChunks:
+        chunks.append('\n\n'.join(chunk))
+    if dropped:
+        print(f"Summary budget reached, dropped {dropped} article(s)")
+    return chunks
+
+def summarize_chunk(model, request, chunk):
+    messages = [SystemMessage(content=MAP_PROMPT.format(request=request)), HumanMessage(content=chunk)]
+    result = model.bind(max_tokens=MAP_OUTPUT_TOKENS).invoke(messages)
+    tokensUsed = sum(count_tokens(message.content) for message in messages) + count_tokens(result.content)
+    return result.content, tokensUsed
+
+def map_chunks(model, request, chunks, parallelism=PARALLELISM):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(chunks)))) as executor:
+        results = list(executor.map(lambda chunk: summarize_chunk(model, request, chunk), chunks))
+    return [summary for summary, tokens in results], sum(tokens for summary, tokens in results)
+
+def map_reduce(model, articlesText, request, budgetTokens, chunkTokens=CHUNK_TOKENS, maxChunks=MAX_CHUNKS, parallelism=PARALLELISM):
+    """Condenses articlesText into notes that fit budgetTokens. Returns (notes, tokensUsed)."""
+    chunks = chunk_articles(split_articles(articlesText), chunkTokens, maxChunks)
+    partials, tokensUsed = map_chunks(model, request, chunks, parallelism)
+    notes = '\n\n'.join(partials)
+    collapses = 0
+    while count_tokens(notes) > budgetTokens and collapses < MAX_COLLAPSES:
+        chunks = chunk_articles(partials, chunkTokens, maxChunks)
+        partials, collapseTokens = map_chunks(model, request, chunks, parallelism)
+        tokensUsed += collapseTokens
+        notes = '\n\n'.join(partials)
+        collapses += 1
+    return truncate_tokens(notes, budgetTokens), tokensUsed
@@ -0,0 +1,82 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from articles import category_label
+from articleDedup import normalize_url
+from filterCache import STOP_WORDS, DATE_WORDS, NUMBER_WORDS, CATEGORY_WORDS, tokenize
+
+CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "summaryCache.db")
+#a summary is reused until its article set changes, this only bounds how long unused entries linger
+SUMMARY_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 24 * 60 * 60))
+
+def fingerprint(articles):
+    """Same articles in any order and from any provider give the same fingerprint."""
+    ids = sorted(normalize_url(article.url) if article.url else (article.title or "") for article in articles)
+    return hashlib.sha1(json.dumps(ids).encode("utf-8")).hexdigest()
+
+def category_key(categories):
+    return json.dumps(sorted(category_label(category) for category in categories))
+
+def normalize_intent(userInput):
+    """What the user asks for beyond "the news for these categories and dates", as sorted words."""
+    ignored = STOP_WORDS | DATE_WORDS | NUMBER_WORDS | CATEGORY_WORDS
+    return ' '.join(sorted({word for word in tokenize(userInput) if word not in ignored and not word.isdigit()}))
+
+class SummaryCache:
+    def __init__(self, path=CACHE_PATH, ttl=SUMMARY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                fingerprint TEXT NOT NULL,
+                category TEXT NOT NULL,
+                intent TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                storedAt REAL NOT NULL,
+                PRIMARY KEY (fingerprint, category, intent)
+            )""")
+        self.conn.commit()
+
+    def contains(self, fingerprint, category, intent):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM summaries WHERE fingerprint = ? AND category = ? AND intent = ? AND storedAt >= ?",
+                                    (fingerprint, category, intent, time.time() - self.ttl)).fetchone()
+        return row is not None
+
+    def get(self, fingerprint, category, intent):
+        with self.lock:
+            row = self.conn.execute("SELECT summary FROM summaries WHERE fingerprint = ? AND category = ? AND intent = ? AND storedAt >= ?",
+                                    (fingerprint, category, intent, time.time() - self.ttl)).fetchone()
+            self.stats["hits" if row is not None else "misses"] += 1
+        return None if row is None else row[0]
+
+    def put(self, fingerprint, category, intent, summary):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)", (fingerprint, category, intent, summary, time.time()))
+            self.conn.commit()
+
+    def purge(self, expiredOnly=True):
+        query = "DELETE FROM summaries"
+        args = []
+        if expiredOnly:
+            query += " WHERE storedAt < ?"
+            args.append(time.time() - self.ttl)
+        with self.lock:
+            removed = self.conn.execute(query, args).rowcount
+            self.conn.commit()
+        return removed
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hitRate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
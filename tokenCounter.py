@@ -0,0 +1,15 @@
+import functools
+import tiktoken
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model="gpt-4"):
+    return tiktoken.encoding_for_model(model)
+
+def count_tokens(text, model="gpt-4"):
+    return len(get_encoding(model).encode(text))
+
+def truncate_tokens(text, maxTokens, model="gpt-4"):
+    tokens = get_encoding(model).encode(text)
+    if len(tokens) <= maxTokens:
+        return text
+    return get_encoding(model).decode(tokens[:maxTokens])
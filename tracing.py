@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+#where finished spans go as JSON lines: "-" for stderr, a file path, or empty to only keep metrics
+TRACE_LOG = os.getenv("TRACE_LOG", "-")
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+#span attributes that are summed into per stage counters
+COUNTED_ATTRIBUTES = ("tokens", "bytes", "articles")
+
+CURRENT_SPAN = contextvars.ContextVar("currentSpan", default=None)
+
+class Span:
+    """One timed stage, nested under whatever span is current when it starts."""
+
+    def __init__(self, name, attributes=None):
+        parent = CURRENT_SPAN.get()
+        self.name = name
+        self.traceId = parent.traceId if parent is not None else os.urandom(8).hex()
+        self.spanId = os.urandom(4).hex()
+        self.parentId = parent.spanId if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.startTime = time.time()
+        self.startNs = time.perf_counter_ns()
+        self.endNs = None
+        self.token = CURRENT_SPAN.set(self)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def seconds(self):
+        return ((self.endNs or time.perf_counter_ns()) - self.startNs) / 1e9
+
+    def end(self, **attributes):
+        if self.endNs is not None:
+            return
+        self.attributes.update(attributes)
+        self.endNs = time.perf_counter_ns()
+        try:
+            CURRENT_SPAN.reset(self.token)
+        except ValueError:
+            #ended from another context, which keeps its own current span
+            pass
+        METRICS.record(self)
+        write_log(self)
+
+    def to_dict(self):
+        record = {
+            "time": round(self.startTime, 6),
+            "trace": self.traceId,
+            "span": self.spanId,
+            "parent": self.parentId,
+            "name": self.name,
+            "durationMs": round(self.seconds() * 1000, 3),
+            "status": "error" if self.error else "ok"
+        }
+        if self.error:
+            record["error"] = self.error
+        record.update(self.attributes)
+        return record
+
+def start_span(name, **attributes):
+    """Starts a span that the caller must end(), for stages with several exits."""
+    return Span(name, attributes)
+
+@contextmanager
+def span(name, **attributes):
+    current = Span(name, attributes)
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end()
+
+def annotate(**attributes):
+    """Adds attributes to the current span, if there is one."""
+    current = CURRENT_SPAN.get()
+    if current is not None:
+        current.set(**attributes)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+def format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+class Metrics:
+    """Per stage latency histograms and counters, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def count(self, name, labels, value=1):
+        key = (name, tuple(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def record(self, span):
+        with self.lock:
+            self.histograms.setdefault(span.name, Histogram()).observe(span.seconds())
+            self.count("news_stage_total", [("stage", span.name), ("status", "error" if span.error else "ok")])
+            for attribute in COUNTED_ATTRIBUTES:
+                value = span.attributes.get(attribute)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self.count(f"news_stage_{attribute}_total", [("stage", span.name)], value)
+            if "cacheHit" in span.attributes:
+                self.count("news_cache_lookups_total", [("stage", span.name), ("hit", str(bool(span.attributes["cacheHit"])).lower())])
+
+    def render(self):
+        lines = ["# TYPE news_stage_duration_seconds histogram"]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'news_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'news_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'news_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'news_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+            names = sorted({name for name, labels in self.counters})
+            for name in names:
+                lines.append(f"# TYPE {name} counter")
+                for (counterName, labels), value in sorted(self.counters.items()):
+                    if counterName == name:
+                        lines.append(f"{name}{{{format_labels(labels)}}} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """{stage: {"count", "p50", "p95"}} estimated from the histogram buckets."""
+        with self.lock:
+            return {stage: {"count": histogram.count,
+                            "p50": bucket_quantile(histogram, 0.5),
+                            "p95": bucket_quantile(histogram, 0.95)}
+                    for stage, histogram in self.histograms.items()}
+
+def bucket_quantile(histogram, fraction):
+    target = fraction * histogram.count
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        if count >= target:
+            return bound
+    return float("inf")
+
+METRICS = Metrics()
+LOG_LOCK = threading.Lock()
+LOG_FILE = None
+
+def write_log(span):
+    global LOG_FILE
+    if not TRACE_LOG:
+        return
+    line = json.dumps(span.to_dict(), default=str) + "\n"
+    #one write per line under a lock, so spans from different threads never interleave
+    with LOG_LOCK:
+        if TRACE_LOG == "-":
+            sys.stderr.write(line)
+            sys.stderr.flush()
+            return
+        if LOG_FILE is None:
+            LOG_FILE = open(TRACE_LOG, "a", encoding="utf-8")
+        LOG_FILE.write(line)
+        LOG_FILE.flush()
+
+def render_metrics():
+    return METRICS.render()
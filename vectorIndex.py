@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores import Chroma
+from articleStore import article_id
+from ranking import source_of
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embeddingCache.db")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "vectorIndex")
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 30))
+
+def content_hash(model, text):
+    return hashlib.sha1(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+def article_text(article):
+    return f"{article.title or ''}\n{article.content or ''}"
+
+class CachedEmbeddings(Embeddings):
+    """Embeds only texts it has never seen, in batches, and keeps every vector on disk by content hash."""
+
+    def __init__(self, embeddings=None, model=EMBEDDING_MODEL, path=EMBEDDING_CACHE_PATH, batchSize=EMBEDDING_BATCH_SIZE):
+        self.embeddings = embeddings or OpenAIEmbeddings(model=model)
+        self.model = model
+        self.batchSize = batchSize
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "embedded": 0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.conn.commit()
+
+    def lookup(self, keys):
+        found = {}
+        with self.lock:
+            #sqlite caps the number of bound parameters, so look keys up a batch at a time
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall()
+                found.update((key, array("f", vector).tolist()) for key, vector in rows)
+        return found
+
+    def embed_documents(self, texts):
+        keys = [content_hash(self.model, text) for text in texts]
+        vectors = self.lookup(list(set(keys)))
+        missing = list(dict.fromkeys((key, text) for key, text in zip(keys, texts) if key not in vectors))
+        for start in range(0, len(missing), self.batchSize):
+            batch = missing[start:start + self.batchSize]
+            embedded = self.embeddings.embed_documents([text for key, text in batch])
+            with self.lock:
+                self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                                      [(key, array("f", vector).tobytes()) for (key, text), vector in zip(batch, embedded)])
+                self.conn.commit()
+            vectors.update((key, vector) for (key, text), vector in zip(batch, embedded))
+        with self.lock:
+            self.stats["hits"] += len(texts) - len(missing)
+            self.stats["embedded"] += len(missing)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class VectorIndex:
+    """Chroma collection of article embeddings, articles are added once by id and never re-embedded."""
+
+    def __init__(self, embeddings=None, path=VECTOR_INDEX_PATH):
+        self.embeddings = embeddings or CachedEmbeddings()
+        self.store = Chroma(collection_name="articles", embedding_function=self.embeddings, persist_directory=path)
+        self.lock = threading.Lock()
+
+    def add_articles(self, articles):
+        """Adds the articles the index does not hold yet, returns how many were added."""
+        byId = {article_id(article): article for article in articles}
+        if not byId:
+            return 0
+        with self.lock:
+            known = set(self.store.get(ids=list(byId), include=[])["ids"])
+            newIds = [articleId for articleId in byId if articleId not in known]
+            documents = [Document(page_content=article_text(byId[articleId]),
+                                  metadata={"id": articleId, "publishedAt": byId[articleId].publishedAt or "", "source": source_of(byId[articleId])})
+                         for articleId in newIds]
+            for start in range(0, len(documents), EMBEDDING_BATCH_SIZE):
+                self.store.add_documents(documents[start:start + EMBEDDING_BATCH_SIZE], ids=newIds[start:start + EMBEDDING_BATCH_SIZE])
+        return len(newIds)
+
+    def retrieve(self, question, articles, k=TOP_K):
+        """The k articles closest to the question, most relevant first, searched among the given articles only."""
+        byId = {article_id(article): article for article in articles}
+        if len(byId) <= k:
+            return list(byId.values())
+        self.add_articles(byId.values())
+        documents = self.store.similarity_search(question, k=k, filter={"id": {"$in": list(byId)}})
+        return [byId[document.metadata["id"]] for document in documents if document.metadata.get("id") in byId]
+
+    def get_stats(self):
+        return dict(self.embeddings.stats) if isinstance(self.embeddings, CachedEmbeddings) else {}